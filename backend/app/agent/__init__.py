@@ -1,11 +1,13 @@
 # Make agent package importable
-from .agent import DocumentAnalysisAgent, get_document_analysis_agent
-from .prompts import build_complete_prompt, build_system_prompt, build_user_prompt
+from .agent import DocumentAnalysisAgent, LLMValidationError, get_document_analysis_agent
+from .prompts import build_complete_prompt, build_system_prompt, build_user_prompt, build_qa_prompt
 
 __all__ = [
     "DocumentAnalysisAgent",
+    "LLMValidationError",
     "get_document_analysis_agent",
     "build_complete_prompt",
     "build_system_prompt",
     "build_user_prompt",
+    "build_qa_prompt",
 ]
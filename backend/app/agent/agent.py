@@ -10,13 +10,36 @@ This module coordinates:
 The agent treats the LLM as untrusted and validates all output.
 """
 
-from typing import Dict, Any
+import functools
+from typing import Dict, Any, List, Union
 from pydantic import ValidationError
 
+from app.logger import logger
 from app.models.schemas import AnalysisResult
 from app.services.llm import get_gemini_service
 from app.services.embeddings import get_embedding_service
-from app.agent.prompts import build_complete_prompt
+from app.agent.prompts import build_system_prompt, build_user_prompt
+
+
+class LLMValidationError(Exception):
+    """
+    LLM returned JSON that doesn't match the AnalysisResult schema.
+    
+    Only references the raw output and Pydantic's error list; the
+    user-facing message is formatted when str() is called, so a bad
+    response doesn't cost a large string copy unless it is reported.
+    """
+    
+    def __init__(self, raw: Union[str, Dict[str, Any]], errors: List[Dict[str, Any]]):
+        super().__init__(raw, errors)
+        self.raw = raw
+        self.errors = errors
+    
+    def __str__(self) -> str:
+        return "; ".join(
+            f"{'.'.join(str(part) for part in error['loc']) or 'output'}: {error['msg']}"
+            for error in self.errors
+        )
 
 
 class DocumentAnalysisAgent:
@@ -58,68 +81,159 @@ class DocumentAnalysisAgent:
             Validated AnalysisResult
             
         Raises:
-            ValidationError: If LLM output doesn't match schema
+            LLMValidationError: If LLM output doesn't match schema
             ValueError: If JSON parsing fails
             Exception: If LLM API fails
         """
         # Step 1: RAG - Retrieve relevant guidelines
         # This is semantic search using embeddings
-        print(f"[{request_id}]   → Sub-step 2.1: RAG Retrieval (Semantic Search)...")
-        print(f"[{request_id}]     • Encoding document text with sentence-transformers...")
+        logger.debug("[%s]   → Sub-step 2.1: RAG Retrieval (Semantic Search)...", request_id)
+        logger.debug("[%s]     • Encoding document text with sentence-transformers...", request_id)
         relevant_guidelines = self.embedding_service.retrieve_relevant_guidelines(
             query=document_text,
             top_k=2  # Get 2 most relevant guidelines
         )
-        print(f"[{request_id}]     • Found {len(relevant_guidelines)} relevant guidelines")
-        print(f"[{request_id}]     ✓ RAG retrieval complete")
+        logger.debug("[%s]     • Found %d relevant guidelines", request_id, len(relevant_guidelines))
+        logger.debug("[%s]     ✓ RAG retrieval complete", request_id)
         
         # Step 2: Build complete prompt
         # Inject retrieved context and document into prompt template
-        print(f"[{request_id}]   → Sub-step 2.2: Building prompt with RAG context...")
-        prompt = build_complete_prompt(
-            document_text=document_text,
-            retrieved_guidelines=relevant_guidelines
-        )
-        print(f"[{request_id}]     • Prompt length: {len(prompt)} characters")
-        print(f"[{request_id}]     ✓ Prompt constructed")
+        # The system prompt goes out as Gemini's system instruction, so the
+        # shared prefix is identical across requests and can be cached
+        logger.debug("[%s]   → Sub-step 2.2: Building prompt with RAG context...", request_id)
+        system_prompt = build_system_prompt(relevant_guidelines)
+        user_prompt = build_user_prompt(document_text)
+        logger.debug("[%s]     • Prompt length: %d characters", request_id, len(system_prompt) + len(user_prompt))
+        logger.debug("[%s]     ✓ Prompt constructed", request_id)
         
         # Step 3: Get LLM response
         # LLM is instructed to return JSON only
-        print(f"[{request_id}] Step 3/5: Calling Google Gemini LLM API...")
-        print(f"[{request_id}]   • Model: Gemini Pro")
-        print(f"[{request_id}]   • Waiting for LLM response...")
-        response_json = self.llm_service.generate_structured_response(prompt, request_id)
-        print(f"[{request_id}]   ✓ LLM response received")
+        logger.info("[%s] Step 3/5: Calling Google Gemini LLM API...", request_id)
+        logger.debug("[%s]   • Model: Gemini Pro", request_id)
+        logger.debug("[%s]   • Waiting for LLM response...", request_id)
+        response_json = self.llm_service.generate_structured_response(
+            user_prompt, request_id, system_instruction=system_prompt
+        )
+        logger.debug("[%s]   ✓ LLM response received", request_id)
         
         # Step 4: Validate output with Pydantic
-        # This is where we treat LLM output as untrusted
-        # If validation fails, Pydantic raises ValidationError
+        # Step 5: Return validated result
+        return self._validate_output(response_json)
+    
+    async def aanalyze_document(self, document_text: str, request_id: str = "agent") -> AnalysisResult:
+        """
+        Async variant of analyze_document.
+        
+        Same pipeline, but retrieval runs in the threadpool and the
+        Gemini call uses the async client, so the event loop can serve
+        other requests while this one waits on I/O.
+        
+        Args:
+            document_text: The document to analyze
+            request_id: Request ID for tracing
+            
+        Returns:
+            Validated AnalysisResult
+            
+        Raises:
+            LLMValidationError: If LLM output doesn't match schema
+            ValueError: If JSON parsing fails
+            Exception: If LLM API fails
+        """
+        # Step 1: RAG - Retrieve relevant guidelines
+        # Retrieval runs in the threadpool, keeping the event loop free
+        logger.debug("[%s]   → Sub-step 2.1: RAG Retrieval (Semantic Search)...", request_id)
+        logger.debug("[%s]     • Encoding document text with sentence-transformers...", request_id)
+        relevant_guidelines = await self.embedding_service.aretrieve_relevant_guidelines(
+            query=document_text,
+            top_k=2  # Get 2 most relevant guidelines
+        )
+        logger.debug("[%s]     • Found %d relevant guidelines", request_id, len(relevant_guidelines))
+        logger.debug("[%s]     ✓ RAG retrieval complete", request_id)
+        
+        # Step 2: Build complete prompt
+        logger.debug("[%s]   → Sub-step 2.2: Building prompt with RAG context...", request_id)
+        system_prompt = build_system_prompt(relevant_guidelines)
+        user_prompt = build_user_prompt(document_text)
+        logger.debug("[%s]     • Prompt length: %d characters", request_id, len(system_prompt) + len(user_prompt))
+        logger.debug("[%s]     ✓ Prompt constructed", request_id)
+        
+        # Step 3: Get LLM response without blocking the event loop
+        logger.info("[%s] Step 3/5: Calling Google Gemini LLM API...", request_id)
+        logger.debug("[%s]   • Model: Gemini Pro", request_id)
+        logger.debug("[%s]   • Waiting for LLM response...", request_id)
+        json_text = await self.llm_service.agenerate_json_text(
+            user_prompt, request_id, system_instruction=system_prompt
+        )
+        logger.debug("[%s]   ✓ LLM response received", request_id)
+        
+        # Step 4: Validate output with Pydantic
+        # Step 5: Return validated result
+        return self._validate_json_text(json_text)
+    
+    def _validate_json_text(self, json_text: str) -> AnalysisResult:
+        """
+        Parse and validate LLM JSON text in a single pydantic-core pass.
+        
+        model_validate_json builds the AnalysisResult straight from the
+        string, with no intermediate dict. If the text isn't valid JSON
+        as sliced (e.g. a stray '}' after the object), falls back to the
+        tolerant extract_json_from_response + _validate_output path.
+        
+        Args:
+            json_text: Candidate JSON text from the LLM
+            
+        Returns:
+            Validated AnalysisResult
+            
+        Raises:
+            LLMValidationError: If LLM output doesn't match schema
+            ValueError: If no valid JSON can be found
+        """
         try:
-            result = AnalysisResult(**response_json)
+            return AnalysisResult.model_validate_json(json_text)
         except ValidationError as e:
-            # Add context to validation error
-            raise ValidationError(
-                f"LLM output validation failed. "
-                f"Output: {response_json}. "
-                f"Errors: {e.errors()}"
-            )
+            errors = e.errors(include_url=False, include_context=False, include_input=False)
+            if errors[0]["type"] != "json_invalid":
+                raise LLMValidationError(json_text, errors) from e
+        
+        return self._validate_output(self.llm_service.extract_json_from_response(json_text))
+    
+    def _validate_output(self, response_json: Dict[str, Any]) -> AnalysisResult:
+        """
+        Validate raw LLM output against the AnalysisResult schema.
+        
+        This is where we treat LLM output as untrusted.
+        If validation fails, LLMValidationError is raised.
+        
+        Args:
+            response_json: Parsed JSON returned by the LLM
+            
+        Returns:
+            Validated AnalysisResult
+        """
+        try:
+            # model_validate hands the dict straight to pydantic-core
+            # instead of unpacking it into keyword arguments first
+            result = AnalysisResult.model_validate(response_json)
+        except ValidationError as e:
+            # Keep the raw output and errors for context; no formatting here
+            raise LLMValidationError(
+                response_json,
+                e.errors(include_url=False, include_context=False, include_input=False)
+            ) from e
         
-        # Step 5: Return validated result
         # At this point, we trust the data because Pydantic validated it
         return result
 
 
-# Singleton instance
-_agent_instance = None
-
-
+@functools.cache
 def get_document_analysis_agent() -> DocumentAnalysisAgent:
     """
     Get singleton instance of DocumentAnalysisAgent.
     
-    Reuses services across requests for efficiency.
+    Reuses services across requests for efficiency. The agent is built
+    during application startup, so request handlers only ever hit the
+    cached instance (no lazy None-check, no construction race).
     """
-    global _agent_instance
-    if _agent_instance is None:
-        _agent_instance = DocumentAnalysisAgent()
-    return _agent_instance
+    return DocumentAnalysisAgent()
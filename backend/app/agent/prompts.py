@@ -10,10 +10,44 @@ Key principles:
 - No hallucination allowed
 """
 
-from typing import List
+import functools
+import string
+from typing import List, Tuple
 from app.models.schemas import AnalysisResult
 
 
+def _split_template(template: str, *fields: str) -> Tuple[str, ...]:
+    """
+    Split a str.format template into its literal segments, once, at import.
+    
+    Returns len(fields) + 1 segments with {{ }} escapes resolved, so a
+    render is plain concatenation: seg0 + value0 + seg1 + value1 + ...
+    Placeholders are checked here, so a typo fails at startup instead
+    of on the first request.
+    
+    Args:
+        template: Template using {name} placeholders
+        fields: Expected placeholder names, in order of appearance
+        
+    Returns:
+        Tuple of literal segments surrounding the placeholders
+        
+    Raises:
+        ValueError: If the template's placeholders don't match fields
+    """
+    segments = [""]
+    names = []
+    for literal, name, _, _ in string.Formatter().parse(template):
+        segments[-1] += literal
+        if name is not None:
+            names.append(name)
+            segments.append("")
+    
+    if tuple(names) != fields:
+        raise ValueError(f"Template placeholders {names} do not match expected {list(fields)}")
+    return tuple(segments)
+
+
 # System prompt defines the AI agent's behavior and constraints
 SYSTEM_PROMPT = """You are a document analysis assistant with strict rules.
 
@@ -55,6 +89,12 @@ Example output:
 """
 
 
+# SYSTEM_PROMPT only has one dynamic slot ({guidelines}), so split it once
+# at import time. Per request we then just concatenate prefix + guidelines
+# + suffix instead of re-running str.format over the whole template.
+_SYSTEM_PROMPT_PREFIX, _SYSTEM_PROMPT_SUFFIX = _split_template(SYSTEM_PROMPT, "guidelines")
+
+
 USER_PROMPT_TEMPLATE = """DOCUMENT TO ANALYZE:
 
 {document_text}
@@ -64,6 +104,34 @@ USER_PROMPT_TEMPLATE = """DOCUMENT TO ANALYZE:
 Analyze the above document and return JSON only.
 """
 
+_USER_PROMPT_HEAD, _USER_PROMPT_TAIL = _split_template(USER_PROMPT_TEMPLATE, "document_text")
+
+
+# Q&A prompt: fixed instructions + per-question context
+# Both are module constants so nothing is rebuilt per question
+QA_SYSTEM_PROMPT = """You are a helpful assistant that answers questions based ONLY on the provided context.
+
+Rules:
+1. Answer the question using ONLY information from the context provided
+2. If the context doesn't contain enough information, say "I don't have enough information to answer that question."
+3. Be concise and direct in your answer
+4. Cite source numbers when referencing specific information (e.g., "According to Source 1...")
+5. Do not make assumptions or add information not in the context
+6. If multiple sources provide the same information, mention all relevant sources"""
+
+
+QA_USER_PROMPT_TEMPLATE = """Context from documents:
+
+{context}
+
+Question: {question}
+
+Answer:"""
+
+_QA_PROMPT_HEAD, _QA_PROMPT_MIDDLE, _QA_PROMPT_TAIL = _split_template(
+    QA_USER_PROMPT_TEMPLATE, "context", "question"
+)
+
 
 def build_system_prompt(retrieved_guidelines: List[str]) -> str:
     """
@@ -78,13 +146,25 @@ def build_system_prompt(retrieved_guidelines: List[str]) -> str:
     Returns:
         Complete system prompt with guidelines
     """
-    # Format guidelines as numbered list
-    guidelines_text = "\n".join([
-        f"{i+1}. {guideline.strip()}"
+    return _build_system_prompt_cached(tuple(retrieved_guidelines))
+
+
+@functools.lru_cache(maxsize=128)
+def _build_system_prompt_cached(retrieved_guidelines: Tuple[str, ...]) -> str:
+    """
+    Render the system prompt for one combination of guidelines.
+    
+    Guidelines come from a small fixed set and top-k retrieval keeps
+    returning the same few subsets, so each distinct tuple is rendered
+    once and later requests get the cached string.
+    """
+    # Format guidelines as numbered list (ANALYSIS_GUIDELINES are pre-stripped)
+    guidelines_text = "\n".join(
+        f"{i+1}. {guideline}"
         for i, guideline in enumerate(retrieved_guidelines)
-    ])
+    )
     
-    return SYSTEM_PROMPT.format(guidelines=guidelines_text)
+    return f"{_SYSTEM_PROMPT_PREFIX}{guidelines_text}{_SYSTEM_PROMPT_SUFFIX}"
 
 
 def build_user_prompt(document_text: str) -> str:
@@ -97,7 +177,7 @@ def build_user_prompt(document_text: str) -> str:
     Returns:
         Complete user prompt
     """
-    return USER_PROMPT_TEMPLATE.format(document_text=document_text)
+    return f"{_USER_PROMPT_HEAD}{document_text}{_USER_PROMPT_TAIL}"
 
 
 def build_complete_prompt(document_text: str, retrieved_guidelines: List[str]) -> str:
@@ -119,3 +199,20 @@ def build_complete_prompt(document_text: str, retrieved_guidelines: List[str]) -
     # Combine system and user prompts
     # For Gemini, we concatenate them directly
     return f"{system_prompt}\n\n{user_prompt}"
+
+
+def build_qa_prompt(question: str, context: str) -> str:
+    """
+    Build prompt for Q&A over retrieved document chunks.
+    
+    Args:
+        question: User's question
+        context: Retrieved context from documents
+        
+    Returns:
+        Complete prompt string
+    """
+    return (
+        f"{QA_SYSTEM_PROMPT}\n\n"
+        f"{_QA_PROMPT_HEAD}{context}{_QA_PROMPT_MIDDLE}{question}{_QA_PROMPT_TAIL}"
+    )
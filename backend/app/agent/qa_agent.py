@@ -4,9 +4,167 @@ Q&A Agent for answering questions about uploaded documents.
 This agent uses RAG to retrieve relevant context and answer questions.
 """
 
-from typing import List, Dict, Any
+import asyncio
+import functools
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import AsyncIterator, List, Dict, Any, Optional, Tuple
+
+import numpy as np
+
+from app.config import settings
+from app.logger import logger
+from app.models.schemas import QuestionSource
 from app.services.llm import get_gemini_service
-from app.services.vector_db import get_vector_db_service
+from app.services.embeddings import get_embedding_service, get_embedding_batcher
+from app.services.vector_db import get_vector_db_service, get_batched_retriever
+from app.agent.prompts import build_qa_prompt
+
+
+class SemanticAnswerCache:
+    """
+    LRU cache of Q&A answers keyed by the meaning of the question.
+    
+    Users often re-ask the same thing in slightly different words.
+    Each cached question is stored as a unit-length embedding, so one
+    matrix-vector product gives the cosine similarity to every cached
+    question. If the best match (for the same document filter and
+    top_k) clears the threshold, its answer is reused and the LLM call
+    is skipped entirely.
+    
+    The cache is tied to a vector DB revision: uploading or deleting a
+    document changes what the answer could be, so the cache is cleared.
+    Entries also expire ttl_seconds after they were stored.
+    """
+    
+    def __init__(self, max_size: int = 256, threshold: float = 0.92, ttl_seconds: float = 3600):
+        """
+        Args:
+            max_size: Maximum number of cached answers (0 disables caching)
+            threshold: Minimum cosine similarity for a cache hit
+            ttl_seconds: Lifetime of a cached answer (0 = no time limit)
+        """
+        self.max_size = max_size
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        # id -> (scope, embedding, result, expiry time on the monotonic clock)
+        self._entries: "OrderedDict[int, Tuple[Tuple[Optional[str], int], np.ndarray, Dict[str, Any], float]]" = OrderedDict()
+        self._next_id = 0
+        self._revision = None
+        self._lock = threading.Lock()
+        
+        # Stacked view of the cached embeddings, rebuilt lazily after changes
+        self._matrix = None
+        self._matrix_ids: List[int] = []
+        self._matrix_scopes: List[Tuple[Optional[str], int]] = []
+        self._matrix_expiry = None
+    
+    def _sync_revision(self, revision: int) -> bool:
+        """
+        Drop every entry if the underlying documents changed.
+        
+        Returns:
+            False if revision is older than the cache's (a lookup or
+            answer that started before the latest upload/delete)
+        """
+        if self._revision is not None and revision < self._revision:
+            return False
+        if revision != self._revision:
+            self._entries.clear()
+            self._matrix = None
+            self._revision = revision
+        return True
+    
+    def get(
+        self,
+        embedding: np.ndarray,
+        document_id: Optional[str],
+        top_k: int,
+        revision: int
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Look up a cached answer for a semantically similar question.
+        
+        Args:
+            embedding: Embedding of the incoming question
+            document_id: Document filter the question was asked with
+            top_k: Number of chunks the answer was built from
+            revision: Current vector DB revision
+            
+        Returns:
+            Cached {answer, sources} dict, or None on a miss
+        """
+        if self.max_size <= 0:
+            return None
+        
+        with self._lock:
+            if not self._sync_revision(revision) or not self._entries:
+                return None
+            
+            if self._matrix is None:
+                self._matrix_ids = list(self._entries)
+                self._matrix_scopes = [self._entries[i][0] for i in self._matrix_ids]
+                self._matrix = np.stack([self._entries[i][1] for i in self._matrix_ids])
+                self._matrix_expiry = np.array([self._entries[i][3] for i in self._matrix_ids])
+            
+            # EmbeddingService returns unit-length vectors: dot product == cosine
+            similarities = self._matrix @ np.asarray(embedding, dtype=np.float32)
+            scope = (document_id, top_k)
+            in_scope = np.fromiter(
+                (s == scope for s in self._matrix_scopes),
+                dtype=bool,
+                count=len(self._matrix_scopes)
+            )
+            # Expired entries never match; LRU eviction reclaims them
+            in_scope &= self._matrix_expiry > time.monotonic()
+            similarities[~in_scope] = -1.0
+            
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.threshold:
+                return None
+            
+            entry_id = self._matrix_ids[best]
+            self._entries.move_to_end(entry_id)
+            return self._entries[entry_id][2]
+    
+    def put(
+        self,
+        embedding: np.ndarray,
+        document_id: Optional[str],
+        top_k: int,
+        revision: int,
+        result: Dict[str, Any]
+    ) -> None:
+        """
+        Store an answer for later near-duplicate questions.
+        
+        Args:
+            embedding: Embedding of the question
+            document_id: Document filter the question was asked with
+            top_k: Number of chunks the answer was built from
+            revision: Vector DB revision the answer was computed against
+            result: The {answer, sources} dict returned to the user
+        """
+        if self.max_size <= 0:
+            return
+        
+        expiry = time.monotonic() + self.ttl_seconds if self.ttl_seconds > 0 else float("inf")
+        with self._lock:
+            # Computed against documents that have since changed: drop it
+            # rather than clearing answers computed after the change
+            if not self._sync_revision(revision):
+                return
+            self._entries[self._next_id] = (
+                (document_id, top_k), np.asarray(embedding, dtype=np.float32), result, expiry
+            )
+            self._next_id += 1
+            
+            # Evict least recently used entries
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+            self._matrix = None
 
 
 class QAAgent:
@@ -24,6 +182,18 @@ class QAAgent:
         """Initialize agent with required services."""
         self.llm_service = get_gemini_service()
         self.vector_db = get_vector_db_service()
+        # Async path coalesces concurrent searches into one batch
+        self.retriever = get_batched_retriever()
+        self.embedding_service = get_embedding_service()
+        # Async path coalesces concurrent question embeddings into one encode
+        self.embedding_batcher = get_embedding_batcher()
+        self.answer_cache = SemanticAnswerCache(
+            max_size=settings.qa_cache_max_size,
+            threshold=settings.qa_cache_similarity_threshold,
+            ttl_seconds=settings.qa_cache_ttl_seconds
+        )
+        # In-flight aanswer_question calls, keyed by (question, document_id, top_k)
+        self._inflight: Dict[Tuple[str, Optional[str], int], asyncio.Future] = {}
     
     def answer_question(
         self, 
@@ -42,116 +212,291 @@ class QAAgent:
         Returns:
             Dict with 'answer' and 'sources' keys
         """
+        # Step 0: Reuse the answer to a near-duplicate question if we have one
+        revision = self.vector_db.revision
+        question_embedding = self.embedding_service.embed_document(question)
+        cached = self.answer_cache.get(question_embedding, document_id, top_k, revision)
+        if cached is not None:
+            logger.debug("      ✓ Semantic cache hit - skipping retrieval and LLM call")
+            return cached
+        
         # Step 1: Retrieve relevant context
-        print(f"      → Sub-step 2.1: Retrieving relevant context from Vector DB...")
-        print(f"      • Query: {question[:60]}...")
-        print(f"      • Top K: {top_k}")
+        self._log_retrieval(question, top_k)
         search_results = self.vector_db.search(
             query=question,
             top_k=top_k,
-            document_id=document_id
+            document_id=document_id,
+            # Already embedded for the answer cache; don't encode it twice
+            query_embedding=question_embedding
         )
         
         if not search_results:
-            print(f"      ⚠ No documents found in database")
-            return {
-                "answer": "I don't have any documents to answer this question. Please upload documents first.",
-                "sources": []
-            }
-        
-        print(f"      • Found {len(search_results)} relevant chunks:")
-        for idx, result in enumerate(search_results, 1):
-            chunk_idx = result['metadata'].get('chunk_index', 0)
-            total_chunks = result['metadata'].get('total_chunks', 1)
-            filename = result['metadata'].get('filename', 'Unknown')
-            print(f"        [{idx}] {filename} - Chunk {chunk_idx+1}/{total_chunks} ({len(result['text'])} chars)")
-        print(f"      ✓ Context retrieved")
-        
-        # Step 2: Build context from search results
-        print(f"    → Sub-step 2.2: Assembling context from search results...")
-        context_parts = []
-        sources = []
+            logger.warning("      ⚠ No documents found in database")
+            return self._no_documents_answer()
         
-        for i, result in enumerate(search_results, 1):
-            # Full text for LLM context (no truncation)
-            context_parts.append(f"[Source {i}]: {result['text']}")
-            
-            # For user display: show full chunk (no truncation)
-            # Since chunks are now 1000 chars with sentence boundaries,
-            # showing the full chunk gives complete context
-            text = result['text']
-            chunk_info = f"(Chunk {result['metadata'].get('chunk_index', 0)+1}/{result['metadata'].get('total_chunks', 1)})"
+        # Steps 2-3: Assemble context and build prompt
+        prompt, sources = self._prepare_prompt(question, search_results)
+        
+        # Step 4: Get LLM response
+        logger.debug("    → Sub-step 2.4: Calling LLM for answer...")
+        try:
+            answer = self.llm_service.generate_response(prompt)
+        except Exception as e:
+            logger.error("      LLM call failed: %s", e)
+            raise ValueError(f"Failed to generate answer: {str(e)}")
+        
+        result = self._finalize_answer(answer, sources)
+        self.answer_cache.put(question_embedding, document_id, top_k, revision, result)
+        return result
+    
+    async def aanswer_question(
+        self, 
+        question: str, 
+        document_id: str = None,
+        top_k: int = 5
+    ) -> Dict[str, Any]:
+        """
+        Async variant of answer_question.
+        
+        Vector search goes through the batched retriever (threadpool,
+        coalesced with concurrent questions) and the LLM call uses the
+        async Gemini client, so the event loop is never blocked.
+        
+        Identical questions that arrive while one is already being
+        answered (same document filter and top_k) share that request
+        instead of each paying for retrieval and an LLM call.
+        
+        Args:
+            question: User's question
+            document_id: Optional specific document to query
+            top_k: Number of relevant chunks to retrieve
             
-            sources.append({
-                "source_number": i,  # Return as int, not str
-                "text": text,  # Show full chunk text, no truncation
-                "document": result['metadata'].get('filename', 'Unknown') + " " + chunk_info,
-                "document_id": result['metadata'].get('document_id', 'Unknown')
-            })
+        Returns:
+            Dict with 'answer' and 'sources' keys
+        """
+        key = (question, document_id, top_k)
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._aanswer_question(question, document_id, top_k))
+            self._inflight[key] = task
+            # Also retrieve the exception: if every waiter was cancelled,
+            # asyncio would otherwise log "Task exception was never retrieved"
+            task.add_done_callback(
+                lambda t: (self._inflight.pop(key, None), t.cancelled() or t.exception())
+            )
+        else:
+            logger.debug("      ✓ Joining in-flight request for the same question")
         
-        context = "\n\n".join(context_parts)
-        print(f"      • Total context: {len(context)} characters")
-        print(f"      ✓ Context assembled")
+        # Shielded: one caller disconnecting must not cancel the answer
+        # the other callers are waiting on
+        return await asyncio.shield(task)
+    
+    async def _aanswer_question(
+        self, 
+        question: str, 
+        document_id: str = None,
+        top_k: int = 5
+    ) -> Dict[str, Any]:
+        """Answer pipeline behind aanswer_question (one run per in-flight key)."""
+        # Step 0: Reuse the answer to a near-duplicate question if we have one
+        revision = self.vector_db.revision
+        question_embedding = await self.embedding_batcher.embed(question)
+        cached = self.answer_cache.get(question_embedding, document_id, top_k, revision)
+        if cached is not None:
+            logger.debug("      ✓ Semantic cache hit - skipping retrieval and LLM call")
+            return cached
         
-        # Step 3: Build prompt
-        print(f"    → Sub-step 2.3: Building Q&A prompt...")
-        prompt = self._build_qa_prompt(question, context)
-        print(f"      • Prompt length: {len(prompt)} characters")
-        print(f"      ✓ Prompt ready")
+        # Step 1: Retrieve relevant context
+        self._log_retrieval(question, top_k)
+        search_results = await self.retriever.search(
+            query=question,
+            top_k=top_k,
+            document_id=document_id,
+            # Already embedded for the answer cache; don't encode it twice
+            query_embedding=question_embedding
+        )
+        
+        if not search_results:
+            logger.warning("      ⚠ No documents found in database")
+            return self._no_documents_answer()
+        
+        # Steps 2-3: Assemble context and build prompt
+        prompt, sources = self._prepare_prompt(question, search_results)
         
         # Step 4: Get LLM response
-        print(f"    → Sub-step 2.4: Calling LLM for answer...")
+        logger.debug("    → Sub-step 2.4: Calling LLM for answer...")
         try:
-            answer = self.llm_service.generate_response(prompt)
-            print(f"      • Answer length: {len(answer)} characters")
-            print(f"      ✓ LLM response received")
+            answer = await self.llm_service.agenerate_response(prompt)
+        except Exception as e:
+            logger.error("      LLM call failed: %s", e)
+            raise ValueError(f"Failed to generate answer: {str(e)}")
+        
+        result = self._finalize_answer(answer, sources)
+        self.answer_cache.put(question_embedding, document_id, top_k, revision, result)
+        return result
+    
+    async def astream_answer_events(
+        self, 
+        question: str, 
+        document_id: str = None,
+        top_k: int = 5
+    ) -> AsyncIterator[Tuple[str, Any]]:
+        """
+        Answer a question, yielding its sources and then the answer text.
+        
+        Retrieval and prompt building are the same as aanswer_question;
+        only the LLM call is streamed. Sources are known before the LLM
+        is called, so they are yielded first and a client can show them
+        while the answer is still generating. The full answer is cached
+        once the stream completes.
+        
+        Args:
+            question: User's question
+            document_id: Optional specific document to query
+            top_k: Number of relevant chunks to retrieve
             
-            return {
-                "answer": answer.strip(),
-                "sources": sources
-            }
+        Yields:
+            ("sources", List[QuestionSource]) once, then ("token", str)
+            per answer chunk
+        """
+        # Step 0: Reuse the answer to a near-duplicate question if we have one
+        revision = self.vector_db.revision
+        question_embedding = await self.embedding_batcher.embed(question)
+        cached = self.answer_cache.get(question_embedding, document_id, top_k, revision)
+        if cached is not None:
+            logger.debug("      ✓ Semantic cache hit - skipping retrieval and LLM call")
+            yield "sources", cached["sources"]
+            yield "token", cached["answer"]
+            return
+        
+        # Step 1: Retrieve relevant context
+        self._log_retrieval(question, top_k)
+        search_results = await self.retriever.search(
+            query=question,
+            top_k=top_k,
+            document_id=document_id,
+            # Already embedded for the answer cache; don't encode it twice
+            query_embedding=question_embedding
+        )
+        
+        if not search_results:
+            logger.warning("      ⚠ No documents found in database")
+            no_documents = self._no_documents_answer()
+            yield "sources", no_documents["sources"]
+            yield "token", no_documents["answer"]
+            return
+        
+        # Steps 2-3: Assemble context and build prompt
+        prompt, sources = self._prepare_prompt(question, search_results)
+        yield "sources", sources
+        
+        # Step 4: Stream LLM response
+        logger.debug("    → Sub-step 2.4: Streaming LLM answer...")
+        chunks = []
+        try:
+            async for chunk in self.llm_service.astream_response(prompt):
+                chunks.append(chunk)
+                yield "token", chunk
         except Exception as e:
-            print(f"      LLM call failed: {str(e)}")
+            logger.error("      LLM call failed: %s", e)
             raise ValueError(f"Failed to generate answer: {str(e)}")
+        
+        result = self._finalize_answer("".join(chunks), sources)
+        self.answer_cache.put(question_embedding, document_id, top_k, revision, result)
     
-    def _build_qa_prompt(self, question: str, context: str) -> str:
+    def _log_retrieval(self, question: str, top_k: int) -> None:
+        """Log the retrieval step before searching the vector DB."""
+        logger.debug("      → Sub-step 2.1: Retrieving relevant context from Vector DB...")
+        logger.debug("      • Query: %s...", question[:60])
+        logger.debug("      • Top K: %d", top_k)
+    
+    def _no_documents_answer(self) -> Dict[str, Any]:
+        """Answer returned when the vector DB has nothing to search."""
+        return {
+            "answer": "I don't have any documents to answer this question. Please upload documents first.",
+            "sources": []
+        }
+    
+    def _prepare_prompt(
+        self,
+        question: str,
+        search_results: List[Dict[str, Any]]
+    ) -> Tuple[str, List[QuestionSource]]:
         """
-        Build prompt for Q&A.
+        Build the Q&A prompt and source citations from search results.
         
         Args:
             question: User's question
-            context: Retrieved context from documents
+            search_results: Chunks returned by the vector DB
             
         Returns:
-            Complete prompt string
+            Tuple of (prompt, sources)
         """
-        system_instructions = """You are a helpful assistant that answers questions based ONLY on the provided context.
-
-Rules:
-1. Answer the question using ONLY information from the context provided
-2. If the context doesn't contain enough information, say "I don't have enough information to answer that question."
-3. Be concise and direct in your answer
-4. Cite source numbers when referencing specific information (e.g., "According to Source 1...")
-5. Do not make assumptions or add information not in the context
-6. If multiple sources provide the same information, mention all relevant sources"""
-
-        user_prompt = f"""Context from documents:
-
-{context}
-
-Question: {question}
-
-Answer:"""
-
-        return f"{system_instructions}\n\n{user_prompt}"
-
+        logger.debug("      • Found %d relevant chunks:", len(search_results))
+        logger.debug("    → Sub-step 2.2: Assembling context from search results...")
+        
+        # Step 2: Build context and citations from the same search results
+        # One pass feeds both the LLM context and the sources we return,
+        # so the retrieved chunks are never walked or fetched twice
+        context_parts = []
+        sources = []
+        log_chunks = logger.isEnabledFor(logging.DEBUG)
+        
+        for i, result in enumerate(search_results, 1):
+            # Look each field up once; used for logging, context and citation
+            text = result['text']
+            metadata = result['metadata']
+            filename = metadata.get('filename', 'Unknown')
+            chunk_number = metadata.get('chunk_index', 0) + 1
+            total_chunks = metadata.get('total_chunks', 1)
+            if log_chunks:
+                logger.debug("        [%d] %s - Chunk %d/%d (%d chars)", i, filename, chunk_number, total_chunks, len(text))
+            
+            # Full text for LLM context (no truncation)
+            context_parts.append(f"[Source {i}]: {text}")
+            
+            # For user display: show full chunk (no truncation)
+            # Since chunks are now 1000 chars with sentence boundaries,
+            # showing the full chunk gives complete context
+            # Built as the response model directly, so QuestionResponse
+            # doesn't re-validate a generic dict per source
+            sources.append(QuestionSource(
+                source_number=i,
+                text=text,  # Show full chunk text, no truncation
+                document=f"{filename} (Chunk {chunk_number}/{total_chunks})",
+                document_id=metadata.get('document_id', 'Unknown')
+            ))
+        logger.debug("      ✓ Context retrieved")
+        
+        context = "\n\n".join(context_parts)
+        logger.debug("      • Total context: %d characters", len(context))
+        logger.debug("      ✓ Context assembled")
+        
+        # Step 3: Build prompt
+        logger.debug("    → Sub-step 2.3: Building Q&A prompt...")
+        prompt = build_qa_prompt(question, context)
+        logger.debug("      • Prompt length: %d characters", len(prompt))
+        logger.debug("      ✓ Prompt ready")
+        
+        return prompt, sources
+    
+    def _finalize_answer(self, answer: str, sources: List[QuestionSource]) -> Dict[str, Any]:
+        """Package the LLM answer with its source citations."""
+        logger.debug("      • Answer length: %d characters", len(answer))
+        logger.debug("      ✓ LLM response received")
+        
+        return {
+            "answer": answer.strip(),
+            "sources": sources
+        }
 
-# Singleton instance
-_qa_agent = None
 
+@functools.cache
 def get_qa_agent() -> QAAgent:
-    """Get or create singleton QAAgent instance."""
-    global _qa_agent
-    if _qa_agent is None:
-        _qa_agent = QAAgent()
-    return _qa_agent
+    """
+    Get singleton QAAgent instance.
+    
+    Built during application startup, so request handlers only ever
+    hit the cached instance.
+    """
+    return QAAgent()
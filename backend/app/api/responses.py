@@ -0,0 +1,24 @@
+"""
+JSON response class for the API.
+
+Pydantic models are serialized by pydantic-core's Rust serializer
+straight to bytes; any other content falls back to orjson.
+"""
+
+from typing import Any
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel
+
+
+class ModelJSONResponse(ORJSONResponse):
+    """
+    ORJSONResponse that renders Pydantic models with model_dump_json.
+
+    Avoids building an intermediate dict (model_dump) or walking the
+    model with jsonable_encoder before encoding.
+    """
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, BaseModel):
+            return content.__pydantic_serializer__.to_json(content)
+        return super().render(content)
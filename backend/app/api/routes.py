@@ -8,21 +8,27 @@ Exposes:
 - GET /documents : List uploaded documents
 - DELETE /documents/{document_id} : Delete document
 - POST /ask : Ask question about documents
+- POST /ask/stream : Ask question, streaming the answer (Server-Sent Events)
 """
 
+import os
+import secrets
 import uuid
 from datetime import datetime
+from anyio import to_thread
 from fastapi import APIRouter, HTTPException, Request, UploadFile, File
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, StreamingResponse
+from pydantic import BaseModel
 from fastapi.templating import Jinja2Templates
-from pydantic import ValidationError
 
 from app.models.schemas import (
     AnalyzeRequest, AnalyzeResponse, AnalysisResult,
     DocumentUploadResponse, DocumentListResponse, DocumentDeleteResponse,
     QuestionRequest, QuestionResponse
 )
-from app.agent.agent import get_document_analysis_agent
+from app.api.responses import ModelJSONResponse
+from app.logger import logger
+from app.agent.agent import LLMValidationError, get_document_analysis_agent
 from app.agent.qa_agent import get_qa_agent
 from app.services.vector_db import get_vector_db_service
 from app.utils.file_parser import FileParser
@@ -34,6 +40,18 @@ router = APIRouter()
 templates = Jinja2Templates(directory="app/templates")
 
 
+def _json_response(model: BaseModel) -> ModelJSONResponse:
+    """
+    Serialize an already-validated response model directly.
+    
+    Returning a Response makes FastAPI skip its response_model pass
+    (re-validating the model we just built and walking it with
+    jsonable_encoder). response_model stays on the route for the
+    OpenAPI schema.
+    """
+    return ModelJSONResponse(model)
+
+
 @router.get("/", response_class=HTMLResponse)
 async def root(request: Request):
     """
@@ -74,72 +92,73 @@ async def analyze_document(request: AnalyzeRequest):
     - 422: Validation error from Pydantic
     - 500: LLM API error or other internal error
     """
-    request_id = str(uuid.uuid4())[:8]
+    request_id = secrets.token_hex(4)
     try:
-        print(f"\n{'='*70}")
-        print(f"[ANALYZE REQUEST {request_id}] NEW DOCUMENT ANALYSIS")
-        print(f"{'='*70}")
-        print(f"[{request_id}] Document length: {len(request.document_text)} characters")
-        print(f"[{request_id}] Document preview: {request.document_text[:100]}...")
+        logger.info("\n" + "=" * 70)
+        logger.info("[ANALYZE REQUEST %s] NEW DOCUMENT ANALYSIS", request_id)
+        logger.info("=" * 70)
+        logger.info("[%s] Document length: %d characters", request_id, len(request.document_text))
+        logger.debug("[%s] Document preview: %s...", request_id, request.document_text[:100])
         
         # Get agent instance
-        print(f"[{request_id}] Step 1/5: Initializing AI Agent...")
+        logger.info("[%s] Step 1/5: Initializing AI Agent...", request_id)
         agent = get_document_analysis_agent()
-        print(f"[{request_id}] ✓ Agent initialized")
+        logger.info("[%s] ✓ Agent initialized", request_id)
         
         # Perform analysis
-        # This may raise ValidationError if LLM output is invalid
-        print(f"[{request_id}] Step 2/5: Starting document analysis pipeline...")
-        result = agent.analyze_document(request.document_text, request_id)
-        print(f"[{request_id}] ✓ Analysis complete")
+        # This may raise LLMValidationError if LLM output is invalid
+        logger.info("[%s] Step 2/5: Starting document analysis pipeline...", request_id)
+        result = await agent.aanalyze_document(request.document_text, request_id)
+        logger.info("[%s] ✓ Analysis complete", request_id)
         
         # Return success response
-        print(f"[{request_id}] Step 5/5: Preparing response...")
-        print(f"[{request_id}] Results: {result.completeness_status.upper()} | Confidence: {result.confidence:.2f}")
-        print(f"[{request_id}] REQUEST COMPLETED SUCCESSFULLY")
-        print(f"{'='*70}\n")
-        return AnalyzeResponse(
+        logger.info("[%s] Step 5/5: Preparing response...", request_id)
+        logger.info("[%s] Results: %s | Confidence: %.2f", request_id, result.completeness_status.upper(), result.confidence)
+        logger.info("[%s] REQUEST COMPLETED SUCCESSFULLY", request_id)
+        logger.info("=" * 70 + "\n")
+        # result was already validated against AnalysisResult by the agent
+        return _json_response(AnalyzeResponse.model_construct(
             success=True,
             result=result,
             error=None
-        )
+        ))
     
-    except ValidationError as e:
+    except LLMValidationError as e:
         # LLM output didn't match schema
         # This shouldn't happen often if prompts are well-designed
-        print(f"[{request_id}] VALIDATION ERROR: LLM output doesn't match schema")
-        print(f"[{request_id}] Error details: {str(e)}")
-        print(f"{'='*70}\n")
+        logger.error("[%s] VALIDATION ERROR: LLM output doesn't match schema", request_id)
+        logger.error("[%s] Error details: %s", request_id, e)
+        logger.info("=" * 70 + "\n")
         error_message = f"AI output validation failed: {str(e)}"
-        return AnalyzeResponse(
+        return _json_response(AnalyzeResponse(
             success=False,
             result=None,
             error=error_message
-        )
+        ))
     
     except ValueError as e:
         # JSON parsing error from LLM response
-        print(f"[{request_id}] JSON PARSING ERROR")
-        print(f"[{request_id}] Error details: {str(e)}")
-        print(f"{'='*70}\n")
+        logger.error("[%s] JSON PARSING ERROR", request_id)
+        logger.error("[%s] Error details: %s", request_id, e)
+        logger.info("=" * 70 + "\n")
         error_message = f"Failed to parse AI response: {str(e)}"
-        return AnalyzeResponse(
+        return _json_response(AnalyzeResponse(
             success=False,
             result=None,
             error=error_message
-        )
+        ))
     
     except Exception as e:
         # Catch-all for other errors (LLM API, etc.)
-        print(f"[{request_id}] UNEXPECTED ERROR: {type(e).__name__}")
-        print(f"[{request_id}] Error details: {str(e)}")
-        print(f"{'='*70}\n")
+        logger.error("[%s] UNEXPECTED ERROR: %s", request_id, type(e).__name__)
+        logger.error("[%s] Error details: %s", request_id, e)
+        logger.info("=" * 70 + "\n")
         error_message = f"Analysis failed: {str(e)}"
-        return AnalyzeResponse(
+        return _json_response(AnalyzeResponse(
             success=False,
             result=None,
             error=error_message
-        )
+        ))
 
 
 @router.get("/health")
@@ -164,18 +183,18 @@ async def upload_document(file: UploadFile = File(...)):
     
     Supports: .txt, .md, .pdf
     """
-    upload_id = str(uuid.uuid4())[:8]
+    upload_id = secrets.token_hex(4)
     try:
-        print(f"\n{'='*70}")
-        print(f"📤 [UPLOAD {upload_id}] NEW DOCUMENT UPLOAD")
-        print(f"{'='*70}")
-        print(f"[{upload_id}] Filename: {file.filename}")
+        logger.info("\n" + "=" * 70)
+        logger.info("📤 [UPLOAD %s] NEW DOCUMENT UPLOAD", upload_id)
+        logger.info("=" * 70)
+        logger.info("[%s] Filename: %s", upload_id, file.filename)
         
         # Check if file format is supported
         if not FileParser.is_supported(file.filename):
-            file_ext = file.filename.lower().split('.')[-1] if '.' in file.filename else 'unknown'
-            print(f"[{upload_id}] ❌ Unsupported format: .{file_ext}")
-            print(f"{'='*70}\n")
+            file_ext = FileParser.get_extension(file.filename) if '.' in file.filename else 'unknown'
+            logger.warning("[%s] ❌ Unsupported format: .%s", upload_id, file_ext)
+            logger.info("=" * 70 + "\n")
             return DocumentUploadResponse(
                 success=False,
                 message=f"Unsupported file format: .{file_ext}",
@@ -184,23 +203,34 @@ async def upload_document(file: UploadFile = File(...)):
         
         # Generate unique document ID
         document_id = str(uuid.uuid4())
-        print(f"[{upload_id}] Assigned document ID: {document_id[:12]}...")
+        logger.info("[%s] Assigned document ID: %s...", upload_id, document_id[:12])
         
-        # Read file content
-        print(f"[{upload_id}] Step 1/4: Reading file content...")
-        content = await file.read()
-        file_ext = file.filename.lower().split('.')[-1]
-        print(f"[{upload_id}]   • File type: .{file_ext}")
-        print(f"[{upload_id}]   • File size: {len(content):,} bytes")
+        # Inspect the uploaded file
+        # Starlette has already spooled the upload to a temporary file
+        # (in memory when small, on disk when large), so we parse from it
+        # directly instead of copying the whole upload into memory first.
+        logger.info("[%s] Step 1/4: Reading file content...", upload_id)
+        upload = file.file
+        upload.seek(0, os.SEEK_END)
+        file_size = upload.tell()
+        upload.seek(0)
+        file_ext = FileParser.get_extension(file.filename)
+        logger.debug("[%s]   • File type: .%s", upload_id, file_ext)
+        logger.debug("[%s]   • File size: %d bytes", upload_id, file_size)
         
         # Parse file based on format (DO NOT decode as UTF-8 first!)
-        print(f"[{upload_id}] Step 2/4: Extracting text from {file_ext.upper()}...")
+        logger.info("[%s] Step 2/4: Extracting text from %s...", upload_id, file_ext.upper())
         try:
-            text = FileParser.parse_text(content, file.filename)
-            print(f"[{upload_id}]   ✓ Text extracted - {len(text):,} characters")
+            # PDF text extraction is CPU-bound; keep it off the event loop
+            text_cache = (
+                await to_thread.run_sync(FileParser.text_cache_path, upload)
+                if file_ext == 'pdf' else None
+            )
+            text = await to_thread.run_sync(FileParser.parse_file, upload, file.filename, text_cache)
+            logger.debug("[%s]   ✓ Text extracted - %d characters", upload_id, len(text))
         except ValueError as e:
-            print(f"[{upload_id}]   ❌ Parsing failed: {str(e)}")
-            print(f"{'='*70}\n")
+            logger.warning("[%s]   ❌ Parsing failed: %s", upload_id, e)
+            logger.info("=" * 70 + "\n")
             return DocumentUploadResponse(
                 success=False,
                 message="Failed to parse file",
@@ -208,8 +238,8 @@ async def upload_document(file: UploadFile = File(...)):
             )
         
         if len(text) < 50:
-            print(f"[{upload_id}] ❌ Document too short: {len(text)} < 50 characters")
-            print(f"{'='*70}\n")
+            logger.warning("[%s] ❌ Document too short: %d < 50 characters", upload_id, len(text))
+            logger.info("=" * 70 + "\n")
             return DocumentUploadResponse(
                 success=False,
                 message="Document too short (minimum 50 characters)",
@@ -217,24 +247,28 @@ async def upload_document(file: UploadFile = File(...)):
             )
         
         # Get vector DB service
-        print(f"[{upload_id}] Step 3/4: Initializing Vector DB service...")
+        logger.info("[%s] Step 3/4: Initializing Vector DB service...", upload_id)
         vector_db = get_vector_db_service()
-        print(f"[{upload_id}]   ✓ Vector DB ready")
+        logger.debug("[%s]   ✓ Vector DB ready", upload_id)
         
         # Add document with metadata
-        print(f"[{upload_id}] Step 4/4: Generating embeddings and storing in Vector DB...")
+        logger.info("[%s] Step 4/4: Generating embeddings and storing in Vector DB...", upload_id)
         metadata = {
             "filename": file.filename,
             "upload_date": datetime.now().isoformat(),
             "file_size": len(text),
             "file_type": file_ext
         }
+        if text_cache is not None:
+            # Lets delete_document remove the cached extracted text too
+            metadata["text_cache"] = text_cache
         
-        vector_db.add_document(document_id, text, metadata)
-        print(f"[{upload_id}]   ✓ Document stored in vector database")
+        # Chunking + embedding is CPU-bound; run it in the threadpool
+        await to_thread.run_sync(vector_db.add_document, document_id, text, metadata)
+        logger.debug("[%s]   ✓ Document stored in vector database", upload_id)
         
-        print(f"[{upload_id}] ✅ DOCUMENT UPLOADED SUCCESSFULLY")
-        print(f"{'='*70}\n")
+        logger.info("[%s] ✅ DOCUMENT UPLOADED SUCCESSFULLY", upload_id)
+        logger.info("=" * 70 + "\n")
         
         return DocumentUploadResponse(
             success=True,
@@ -244,18 +278,18 @@ async def upload_document(file: UploadFile = File(...)):
         )
     
     except UnicodeDecodeError as e:
-        print(f"[{upload_id}] ❌ ENCODING ERROR: File not in UTF-8 format")
-        print(f"[{upload_id}] Error details: {str(e)}")
-        print(f"{'='*70}\n")
+        logger.error("[%s] ❌ ENCODING ERROR: File not in UTF-8 format", upload_id)
+        logger.error("[%s] Error details: %s", upload_id, e)
+        logger.info("=" * 70 + "\n")
         return DocumentUploadResponse(
             success=False,
             message="Failed to read file",
             error="Text file must be in UTF-8 format"
         )
     except Exception as e:
-        print(f"[{upload_id}] ❌ UPLOAD FAILED: {type(e).__name__}")
-        print(f"[{upload_id}] Error details: {str(e)}")
-        print(f"{'='*70}\n")
+        logger.error("[%s] ❌ UPLOAD FAILED: %s", upload_id, type(e).__name__)
+        logger.error("[%s] Error details: %s", upload_id, e)
+        logger.info("=" * 70 + "\n")
         return DocumentUploadResponse(
             success=False,
             message="Upload failed",
@@ -315,53 +349,106 @@ async def ask_question(request: QuestionRequest):
     
     Uses RAG to retrieve relevant context and generate answer.
     """
-    question_id = str(uuid.uuid4())[:8]
+    question_id = secrets.token_hex(4)
     try:
-        print(f"\n{'='*70}")
-        print(f"❓ [Q&A {question_id}] NEW QUESTION")
-        print(f"{'='*70}")
-        print(f"[{question_id}] Question: {request.question}")
+        logger.info("\n" + "=" * 70)
+        logger.info("❓ [Q&A %s] NEW QUESTION", question_id)
+        logger.info("=" * 70)
+        logger.info("[%s] Question: %s", question_id, request.question)
         if request.document_id:
-            print(f"[{question_id}] Target document: {request.document_id[:12]}...")
+            logger.info("[%s] Target document: %s...", question_id, request.document_id[:12])
         else:
-            print(f"[{question_id}] Searching all documents")
+            logger.info("[%s] Searching all documents", question_id)
         
         # Get Q&A agent
-        print(f"[{question_id}] Step 1/3: Initializing Q&A Agent...")
+        logger.info("[%s] Step 1/3: Initializing Q&A Agent...", question_id)
         qa_agent = get_qa_agent()
-        print(f"[{question_id}] ✓ Agent ready")
+        logger.info("[%s] ✓ Agent ready", question_id)
         
         # Get answer
-        print(f"[{question_id}] Step 2/3: Processing question with RAG pipeline...")
-        result = qa_agent.answer_question(
+        logger.info("[%s] Step 2/3: Processing question with RAG pipeline...", question_id)
+        result = await qa_agent.aanswer_question(
             question=request.question,
             document_id=request.document_id
         )
-        print(f"[{question_id}] ✓ Answer generated")
+        logger.info("[%s] ✓ Answer generated", question_id)
         
-        print(f"[{question_id}] Step 3/3: Preparing response...")
-        print(f"[{question_id}] Sources: {len(result['sources'])} document chunks")
-        print(f"[{question_id}] QUESTION ANSWERED SUCCESSFULLY")
-        print(f"{'='*70}\n")
+        logger.info("[%s] Step 3/3: Preparing response...", question_id)
+        logger.info("[%s] Sources: %d document chunks", question_id, len(result['sources']))
+        logger.info("[%s] QUESTION ANSWERED SUCCESSFULLY", question_id)
+        logger.info("=" * 70 + "\n")
         
-        return QuestionResponse(
+        return _json_response(QuestionResponse(
             success=True,
             answer=result["answer"],
             sources=result["sources"]
-        )
+        ))
     
     except ValueError as e:
-        print(f"[{question_id}] VALIDATION ERROR: {str(e)}")
-        print(f"{'='*70}\n")
-        return QuestionResponse(
+        logger.error("[%s] VALIDATION ERROR: %s", question_id, e)
+        logger.info("=" * 70 + "\n")
+        return _json_response(QuestionResponse(
             success=False,
             error=str(e)
-        )
+        ))
     except Exception as e:
-        print(f"[{question_id}] ERROR: {type(e).__name__}")
-        print(f"[{question_id}] Error details: {str(e)}")
-        print(f"{'='*70}\n")
-        return QuestionResponse(
+        logger.error("[%s] ERROR: %s", question_id, type(e).__name__)
+        logger.error("[%s] Error details: %s", question_id, e)
+        logger.info("=" * 70 + "\n")
+        return _json_response(QuestionResponse(
             success=False,
             error=f"Failed to answer question: {str(e)}"
-        )
+        ))
+
+
+def _sse_event(data: str, event: str = None) -> str:
+    """
+    Format one Server-Sent Event.
+    
+    Multi-line payloads are split into several data: lines so
+    newlines inside the answer don't terminate the event early.
+    """
+    lines = [f"event: {event}"] if event else []
+    lines.extend(f"data: {line}" for line in data.split("\n"))
+    return "\n".join(lines) + "\n\n"
+
+
+@router.post("/ask/stream")
+async def ask_question_stream(request: QuestionRequest):
+    """
+    Ask a question and stream the answer as Server-Sent Events.
+    
+    A "sources" event (JSON array of citations) is sent first, as
+    soon as retrieval finishes. Each answer chunk is then sent as a
+    data event as soon as Gemini produces it, followed by a final
+    "done" event. Failures are reported as an "error" event since the
+    status code is already sent.
+    """
+    question_id = secrets.token_hex(4)
+    logger.info("\n" + "=" * 70)
+    logger.info("❓ [Q&A STREAM %s] NEW QUESTION", question_id)
+    logger.info("=" * 70)
+    logger.info("[%s] Question: %s", question_id, request.question)
+    
+    qa_agent = get_qa_agent()
+    
+    async def event_stream():
+        try:
+            async for kind, payload in qa_agent.astream_answer_events(
+                question=request.question,
+                document_id=request.document_id
+            ):
+                if kind == "sources":
+                    sources_json = ",".join(source.model_dump_json() for source in payload)
+                    yield _sse_event(f"[{sources_json}]", event="sources")
+                else:
+                    yield _sse_event(payload)
+            logger.info("[%s] QUESTION ANSWERED SUCCESSFULLY (streamed)", question_id)
+            yield _sse_event("[DONE]", event="done")
+        except Exception as e:
+            logger.error("[%s] ERROR: %s", question_id, type(e).__name__)
+            logger.error("[%s] Error details: %s", question_id, e)
+            yield _sse_event(f"Failed to answer question: {str(e)}", event="error")
+        logger.info("=" * 70 + "\n")
+    
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
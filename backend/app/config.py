@@ -5,6 +5,7 @@ Centralizes all environment variables and configuration.
 """
 
 import os
+from typing import Literal, Optional
 from pydantic_settings import BaseSettings
 from pydantic import Field
 
@@ -25,12 +26,85 @@ class Settings(BaseSettings):
     gemini_api_key: str = Field(..., alias="GEMINI_API_KEY")
     gemini_model_name: str = Field(default="gemini-pro", alias="GEMINI_MODEL_NAME")
     temperature: float = Field(default=0.1, alias="TEMPERATURE", ge=0.0, le=2.0)
+    # Native JSON output (response_mime_type) for structured calls.
+    # Unset enables it only for models that support it (gemini-1.5 and
+    # later); gemini-pro (1.0) rejects it.
+    gemini_json_mode: Optional[bool] = Field(default=None, alias="GEMINI_JSON_MODE")
     
     # Embedding Configuration
     embedding_model_name: str = Field(
         default="all-MiniLM-L6-v2", 
         alias="EMBEDDING_MODEL_NAME"
     )
+    # Inference runtime for the embedding model. "onnx" needs
+    # optimum[onnxruntime]; "openvino" needs optimum[openvino].
+    embedding_backend: Literal["torch", "onnx", "openvino"] = Field(
+        default="torch",
+        alias="EMBEDDING_BACKEND"
+    )
+    # Optional model file inside the model repo, e.g. an INT8-quantized
+    # export such as "onnx/model_qint8_avx512_vnni.onnx"
+    embedding_model_file: Optional[str] = Field(default=None, alias="EMBEDDING_MODEL_FILE")
+    # Device for the torch backend, e.g. "cpu" or "cuda". Unset picks CUDA
+    # when available; on CUDA the model runs in fp16.
+    embedding_device: Optional[str] = Field(default=None, alias="EMBEDDING_DEVICE")
+    # int8 dynamic quantization of the Linear layers for the torch
+    # backend on CPU (ignored on CUDA, where fp16 is used instead)
+    embedding_quantize: bool = Field(default=False, alias="EMBEDDING_QUANTIZE")
+    # Chunks per forward pass when ingesting documents (raise on GPU)
+    embedding_batch_size: int = Field(default=64, alias="EMBEDDING_BATCH_SIZE", ge=1)
+    # Comma-separated devices (e.g. "cuda:0,cuda:1") for a multi-process
+    # ingestion pool, one worker per device. Unset encodes in-process.
+    embedding_pool_devices: Optional[str] = Field(default=None, alias="EMBEDDING_POOL_DEVICES")
+    # CPU-only alternative: number of CPU worker processes for ingestion
+    # (ignored when EMBEDDING_POOL_DEVICES is set). 0 encodes in-process.
+    embedding_pool_cpu_workers: int = Field(default=0, alias="EMBEDDING_POOL_CPU_WORKERS", ge=0)
+    # Cache chunk embeddings on disk by content hash, so identical chunks
+    # in re-uploaded or revised documents are not encoded again
+    embedding_cache: bool = Field(default=True, alias="EMBEDDING_CACHE")
+    # Most cached chunk embeddings kept; least recently used are evicted
+    # (about 150 MB at the default size with 384-dim embeddings)
+    embedding_cache_max_rows: int = Field(default=100_000, alias="EMBEDDING_CACHE_MAX_ROWS", ge=1)
+    
+    # Maximal Marginal Relevance for document search: 1.0 = pure relevance,
+    # lower values favour diverse chunks. Unset disables MMR.
+    retrieval_mmr_lambda: Optional[float] = Field(
+        default=None,
+        alias="RETRIEVAL_MMR_LAMBDA",
+        ge=0.0,
+        le=1.0
+    )
+    
+    # Q&A semantic cache: reuse answers for near-duplicate questions
+    qa_cache_max_size: int = Field(default=256, alias="QA_CACHE_MAX_SIZE", ge=0)
+    qa_cache_similarity_threshold: float = Field(
+        default=0.92,
+        alias="QA_CACHE_SIMILARITY_THRESHOLD",
+        ge=0.0,
+        le=1.0
+    )
+    # Seconds a cached answer stays valid (0 = until evicted or documents change)
+    qa_cache_ttl_seconds: float = Field(default=3600, alias="QA_CACHE_TTL_SECONDS", ge=0)
+    
+    # Worker threads for blocking calls (sync LLM calls, embeddings, ChromaDB).
+    # Mostly I/O-bound, so well above Starlette's default of 40.
+    threadpool_size: int = Field(default=200, alias="FASTAPI_THREADPOOL", ge=1)
+    
+    # Directory for extracted PDF text, keyed by file hash, so re-uploading
+    # the same PDF (e.g. when re-indexing) skips parsing. Entries are
+    # removed with their document. Unset disables the cache.
+    pdf_text_cache_dir: Optional[str] = Field(default=None, alias="PDF_TEXT_CACHE_DIR")
+    
+    # Worker processes for pypdf page extraction of large PDFs (32+
+    # pages). 0 or 1 parses in-process. Workers are spawned and import
+    # only pypdf, plus the launching script: start the server with the
+    # uvicorn CLI rather than "python -m app.main" to keep them small.
+    pdf_parse_workers: int = Field(default=0, alias="PDF_PARSE_WORKERS", ge=0)
+    
+    # Application log level (DEBUG, INFO, WARNING, ...)
+    log_level: str = Field(default="INFO", alias="LOG_LEVEL")
+    # Optional log file (rotated at 10 MB, 5 backups) in addition to stdout
+    log_file: Optional[str] = Field(default=None, alias="LOG_FILE")
     
     class Config:
         env_file = ".env"
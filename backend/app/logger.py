@@ -0,0 +1,60 @@
+"""
+Application logger.
+
+Records are put on an in-memory queue and written to stdout (and
+LOG_FILE, if set) by a background QueueListener thread, so logging from
+a request handler is just an enqueue and never blocks the event loop on
+console or disk I/O.
+
+Usage:
+    from app.logger import logger
+    logger.info("[%s] Step 1: ...", request_id)
+"""
+
+import atexit
+import logging
+import os
+import queue
+import sys
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+from app.config import settings
+
+
+def _build_logger() -> logging.Logger:
+    """
+    Create the "analyzer" logger backed by a QueueHandler.
+
+    Returns:
+        Configured logger (idempotent: handlers are attached only once)
+    """
+    app_logger = logging.getLogger("analyzer")
+    if app_logger.handlers:
+        return app_logger
+
+    # Messages already carry their own [TAG] prefixes, keep output as-is
+    console = logging.StreamHandler(sys.stdout)
+    console.setFormatter(logging.Formatter("%(message)s"))
+    handlers = [console]
+
+    if settings.log_file:
+        os.makedirs(os.path.dirname(settings.log_file) or ".", exist_ok=True)
+        log_file = RotatingFileHandler(
+            settings.log_file, maxBytes=10 * 1024 * 1024, backupCount=5, encoding="utf-8"
+        )
+        log_file.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(message)s"))
+        handlers.append(log_file)
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    # Drain anything still queued when the process exits
+    atexit.register(listener.stop)
+
+    app_logger.addHandler(QueueHandler(log_queue))
+    app_logger.setLevel(settings.log_level.upper())
+    app_logger.propagate = False
+    return app_logger
+
+
+logger = _build_logger()
@@ -8,14 +8,112 @@ This is the main file that:
 - Starts the server
 """
 
+import asyncio
+import sys
+import orjson
 from contextlib import asynccontextmanager
+from anyio import to_thread
 from fastapi import FastAPI, Request
-from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.exceptions import RequestValidationError
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
 
 from app.api import router
+from app.api.responses import ModelJSONResponse
+from app.config import settings
+from app.logger import logger
+from app.agent.agent import get_document_analysis_agent
+from app.agent.qa_agent import get_qa_agent
+from app.services.embeddings import get_embedding_service
+from app.services.llm import get_gemini_service
+from app.services.vector_db import get_vector_db_service
+from app.utils.file_parser import shutdown_pdf_executor
+
+
+def warm_up_services() -> None:
+    """
+    Load models and open connections before the first request.
+    
+    Without this, the first /analyze or /ask pays for loading the
+    sentence-transformers weights, opening ChromaDB and configuring
+    the Gemini client. A failure here is not fatal: services will
+    simply be created lazily on first use, as before.
+    """
+    try:
+        # Embedding model for guideline retrieval; throwaway encodes warm the kernels
+        get_embedding_service().warmup()
+        logger.info("[STARTUP]   ✓ Embedding model loaded")
+        
+        # Vector DB opens the Chroma collection (the encoder is shared)
+        get_vector_db_service()
+        logger.info("[STARTUP]   ✓ Vector DB ready")
+        
+        # Gemini client (configuration only, no tokens spent)
+        get_gemini_service()
+        logger.info("[STARTUP]   ✓ Gemini client configured")
+        
+        # Agents are cached singletons; build them now, before any request
+        get_document_analysis_agent()
+        get_qa_agent()
+        logger.info("[STARTUP]   ✓ Agents ready")
+    except Exception as e:
+        logger.warning("[STARTUP]   ⚠ Warmup failed, services will load on first request: %s", e)
+
+
+async def warm_up_gemini_connection() -> None:
+    """
+    Establish the Gemini API connection during startup.
+    
+    Runs inside the server's event loop so the async channel it opens
+    is the one request handlers will reuse.
+    """
+    try:
+        await get_gemini_service().awarmup()
+        logger.info("[STARTUP]   ✓ Gemini connection established")
+    except Exception as e:
+        logger.warning("[STARTUP]   ⚠ Gemini warmup failed, connecting on first request: %s", e)
+
+
+def check_event_loop() -> None:
+    """
+    Warn when the server is not running on uvloop.
+    
+    uvicorn silently falls back to the asyncio loop if uvloop is missing
+    or another launcher didn't request it. Windows has no uvloop build.
+    """
+    if sys.platform == "win32":
+        return
+    loop_module = type(asyncio.get_running_loop()).__module__
+    if not loop_module.startswith("uvloop"):
+        logger.warning("[STARTUP]   ⚠ Running on the default asyncio loop; install uvicorn[standard] for uvloop")
+
+
+class HealthCheckMiddleware:
+    """
+    Answer GET /health before routing.
+    
+    Liveness probes hit this constantly; a pure ASGI middleware replies
+    with a pre-encoded body instead of going through routing, request
+    parsing and response serialization. The /health route stays
+    registered so it still appears in the API docs.
+    """
+    
+    BODY = orjson.dumps({"status": "healthy", "service": "AI Agent Document Analyzer"})
+    HEADERS = [
+        (b"content-type", b"application/json"),
+        (b"content-length", str(len(BODY)).encode()),
+    ]
+    
+    def __init__(self, app: ASGIApp):
+        self.app = app
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["path"] != "/health" or scope["method"] != "GET":
+            await self.app(scope, receive, send)
+            return
+        await send({"type": "http.response.start", "status": 200, "headers": self.HEADERS})
+        await send({"type": "http.response.body", "body": self.BODY})
 
 
 @asynccontextmanager
@@ -26,23 +124,39 @@ async def lifespan(app: FastAPI):
     Replaces deprecated @app.on_event decorators.
     """
     # Startup
-    print("\n" + "="*70)
-    print("🚀 AI AGENT DEMO APPLICATION STARTING")
-    print("="*70)
-    print("\n[STARTUP] Step 1/3: Loading configuration...")
-    print("[STARTUP] Step 2/3: Initializing AI services (LLM, Embeddings, Vector DB)...")
-    print("[STARTUP] Step 3/3: Registering API routes...")
-    print("\n✅ APPLICATION READY!")
-    print("📍 Server URL: http://localhost:8000")
-    print("📚 API Docs: http://localhost:8000/docs")
-    print("="*70 + "\n")
+    logger.info("\n" + "="*70)
+    logger.info("🚀 AI AGENT DEMO APPLICATION STARTING")
+    logger.info("="*70)
+    # All startup work lives here: configuration is loaded on import,
+    # models/DB/agents are built before the first request, then the
+    # Gemini connection is opened inside the server's event loop.
+    logger.info("\n[STARTUP] Step 1/3: Configuration loaded, API routes registered")
+    check_event_loop()
+    # Threadpool used by sync endpoints and to_thread.run_sync offloads
+    to_thread.current_default_thread_limiter().total_tokens = settings.threadpool_size
+    logger.info("[STARTUP] Step 2/3: Initializing AI services (LLM, Embeddings, Vector DB, Agents)...")
+    # Model loading is blocking work; keep it off the event loop
+    await to_thread.run_sync(warm_up_services)
+    logger.info("[STARTUP] Step 3/3: Connecting to Gemini API...")
+    await warm_up_gemini_connection()
+    logger.info("\n✅ APPLICATION READY!")
+    logger.info("📍 Server URL: http://localhost:8000")
+    logger.info("📚 API Docs: http://localhost:8000/docs")
+    logger.info("="*70 + "\n")
     
     yield
     
     # Shutdown
-    print("\n" + "="*70)
-    print("🛑 SHUTTING DOWN AI AGENT DEMO APPLICATION")
-    print("="*70 + "\n")
+    logger.info("\n" + "="*70)
+    logger.info("🛑 SHUTTING DOWN AI AGENT DEMO APPLICATION")
+    logger.info("="*70 + "\n")
+    # Stop ingestion worker processes (no-op unless an encode pool is
+    # configured); skipped if the service was never built, so shutdown
+    # doesn't open Chroma and load the model just to close them
+    if get_vector_db_service.cache_info().currsize:
+        get_vector_db_service().close()
+    # Stop PDF parsing worker processes (no-op unless a large PDF started them)
+    shutdown_pdf_executor()
 
 
 # Create FastAPI application
@@ -50,25 +164,35 @@ app = FastAPI(
     title="AI Agent Document Analysis Demo",
     description="Educational demo showing AI Agent principles with Gemini, LangChain, and RAG",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    # pydantic-core / orjson serialize responses several times faster than stdlib json
+    default_response_class=ModelJSONResponse
 )
 
 # Add exception handler for validation errors
 @app.exception_handler(RequestValidationError)
 async def validation_exception_handler(request: Request, exc: RequestValidationError):
     """Log and return detailed validation errors."""
-    print(f"[ERROR] Validation failed for {request.url}")
-    print(f"[ERROR] Details: {exc.errors()}")
-    print(f"[ERROR] Body: {exc.body}")
-    return JSONResponse(
+    # Read the error list once for both the log and the response
+    # (FastAPI already builds it without per-error docs URLs)
+    errors = exc.errors()
+    logger.warning(
+        "[ERROR] Validation failed for %s\n[ERROR] Details: %s\n[ERROR] Body: %s",
+        request.url, errors, exc.body
+    )
+    return ORJSONResponse(
         status_code=422,
         content={
             "success": False,
             "result": None,
-            "error": f"Validation error: {exc.errors()}"
+            "error": f"Validation error: {errors}"
         }
     )
 
+# Health probes are answered here; added before CORS so that CORS still
+# wraps it (the last middleware added is the outermost)
+app.add_middleware(HealthCheckMiddleware)
+
 # Configure CORS (for development)
 # In production, specify allowed origins explicitly
 app.add_middleware(
@@ -84,14 +208,28 @@ app.include_router(router)
 
 
 if __name__ == "__main__":
+    import os
     import uvicorn
     
+    # Auto-reload only when explicitly developing (ENV=dev): it runs a file
+    # watcher process, and on Windows it causes multiprocessing issues with
+    # torch/sentence-transformers
+    dev_mode = os.getenv("ENV") == "dev"
+    
     # Run the application
-    # Note: reload=False to avoid Windows multiprocessing issues with torch/sentence-transformers
     uvicorn.run(
         "app.main:app",
         host="0.0.0.0",
         port=8000,
-        reload=False,  # Disabled for Windows compatibility
-        log_level="info"
+        reload=dev_mode,
+        # Fast libuv event loop and C HTTP parser (both from uvicorn[standard]);
+        # uvloop has no Windows build, so Windows keeps the default asyncio loop
+        loop="asyncio" if sys.platform == "win32" else "uvloop",
+        http="httptools",
+        # Per-request access lines are noise in production; app logs keep LOG_LEVEL
+        log_level="info" if dev_mode else "warning",
+        # Single worker: the Chroma directory and embedding cache can't be
+        # shared between processes, and each worker would load its own
+        # models and keep its own (soon stale) Q&A answer cache
+        workers=1
     )
@@ -9,7 +9,7 @@ Key principle: Treat LLM output as untrusted until validated.
 """
 
 from typing import Literal, List, Optional, Dict
-from pydantic import BaseModel, Field, validator
+from pydantic import BaseModel, Field, model_validator
 
 
 class AnalysisResult(BaseModel):
@@ -39,7 +39,7 @@ class AnalysisResult(BaseModel):
     evidence: List[str] = Field(
         ...,
         description="Direct quotes or references from document supporting the analysis",
-        min_items=1
+        min_length=1
     )
     
     confidence: float = Field(
@@ -49,16 +49,15 @@ class AnalysisResult(BaseModel):
         le=1.0
     )
     
-    @validator('missing_points')
-    def validate_missing_points_with_status(cls, v, values):
+    @model_validator(mode="after")
+    def validate_missing_points_with_status(self) -> "AnalysisResult":
         """
         Ensure missing_points is consistent with completeness_status.
         If status is 'complete', missing_points should be empty.
         """
-        if 'completeness_status' in values:
-            if values['completeness_status'] == 'complete' and len(v) > 0:
-                raise ValueError("Cannot have missing_points when status is 'complete'")
-        return v
+        if self.completeness_status == 'complete' and self.missing_points:
+            raise ValueError("Cannot have missing_points when status is 'complete'")
+        return self
 
 
 class AnalyzeRequest(BaseModel):
@@ -82,13 +81,6 @@ class AnalyzeResponse(BaseModel):
     success: bool = Field(..., description="Whether analysis succeeded")
     result: AnalysisResult | None = Field(None, description="Analysis result if successful")
     error: str | None = Field(None, description="Error message if failed")
-    
-    @validator('result')
-    def validate_result_with_success(cls, v, values):
-        """Ensure result exists when success is True."""
-        if values.get('success') and v is None:
-            raise ValueError("Result must be provided when success is True")
-        return v
 
 
 # New schemas for document upload and Q&A
@@ -1,10 +1,28 @@
 # Make services package importable
-from .llm import GeminiService, get_gemini_service
-from .embeddings import EmbeddingService, get_embedding_service
-
-__all__ = [
-    "GeminiService",
-    "get_gemini_service",
-    "EmbeddingService",
-    "get_embedding_service",
-]
+# Exports are resolved lazily (PEP 562): importing one submodule, e.g.
+# app.services.vector_db, no longer pulls in google.generativeai and
+# sentence-transformers through this package's __init__.
+from importlib import import_module
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .llm import GeminiService, get_gemini_service
+    from .embeddings import EmbeddingService, get_embedding_service
+
+_EXPORTS = {
+    "GeminiService": ".llm",
+    "get_gemini_service": ".llm",
+    "EmbeddingService": ".embeddings",
+    "get_embedding_service": ".embeddings",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name: str):
+    """Import the submodule behind an export on first access."""
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(import_module(_EXPORTS[name], __name__), name)
+    globals()[name] = value  # later lookups skip __getattr__
+    return value
@@ -8,11 +8,74 @@ This module isolates LLM interaction logic and provides:
 - JSON extraction from LLM output
 """
 
-import json
+import functools
 import re
-from typing import Dict, Any
+from typing import AsyncIterator, Dict, Any, Optional
 import google.generativeai as genai
+import orjson
 from app.config import settings
+from app.logger import logger
+
+
+def _strip_code_fence(text: str) -> str:
+    """
+    Return the body of the first ``` fenced block, or the text unchanged.
+    
+    Drops the opening fence line (``` or ```json) and everything from
+    the closing fence on, using plain str.find (no regex).
+    """
+    fence = text.find("```")
+    if fence == -1:
+        return text
+    body_start = text.find("\n", fence) + 1
+    body_end = text.find("```", body_start) if body_start else -1
+    if body_end == -1:
+        return text
+    return text[body_start:body_end]
+
+
+def _balanced_object_end(text: str, start: int) -> Optional[int]:
+    """
+    Find the index just past the '}' that closes the object at text[start].
+    
+    Walks the text once counting brace depth, ignoring braces that
+    appear inside JSON strings (and escaped quotes within them).
+    
+    Returns:
+        End index (exclusive), or None if the object never closes
+    """
+    depth = 0
+    in_string = False
+    escaped = False
+    for i in range(start, len(text)):
+        char = text[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char == "{":
+            depth += 1
+        elif char == "}":
+            depth -= 1
+            if depth == 0:
+                return i + 1
+    return None
+
+
+def _supports_json_mode(model_name: str) -> bool:
+    """
+    Whether a Gemini model accepts response_mime_type="application/json".
+    
+    Native JSON output arrived with gemini-1.5; "gemini-pro" and the
+    1.0 models reject it. Names without a version are assumed not to.
+    """
+    match = re.search(r"gemini-(\d+)\.(\d+)", model_name)
+    return match is not None and (int(match[1]), int(match[2])) >= (1, 5)
 
 
 class GeminiService:
@@ -45,18 +108,60 @@ class GeminiService:
             "max_output_tokens": 2048,
         }
         
+        # Structured calls ask Gemini for application/json output, so the
+        # response is bare JSON and takes the extraction fast path. Passed
+        # per call (merged over the model's config by the SDK): the same
+        # model also serves plain-text Q&A answers.
+        json_mode = settings.gemini_json_mode
+        if json_mode is None:
+            json_mode = _supports_json_mode(settings.gemini_model_name)
+        self.json_generation_config = (
+            {"response_mime_type": "application/json"}
+            if json_mode else None
+        )
+        
         # Initialize model
         self.model = genai.GenerativeModel(
             model_name=settings.gemini_model_name,
             generation_config=self.generation_config
         )
+        
+        # One model per distinct system instruction. The instruction is
+        # sent as its own field instead of being pasted in front of every
+        # prompt, so Gemini sees an identical prefix across requests and
+        # can serve it from its prefix cache. Only a handful of distinct
+        # system prompts exist (guideline subsets), so this stays small.
+        self._model_for_system = functools.lru_cache(maxsize=32)(self._build_model)
+    
+    def _build_model(self, system_instruction: str) -> genai.GenerativeModel:
+        """Create a model bound to a system instruction (see _model_for_system)."""
+        return genai.GenerativeModel(
+            model_name=settings.gemini_model_name,
+            generation_config=self.generation_config,
+            system_instruction=system_instruction
+        )
+    
+    def _get_model(self, system_instruction: Optional[str]) -> genai.GenerativeModel:
+        """Return the model for a system instruction, or the plain model."""
+        if system_instruction is None:
+            return self.model
+        return self._model_for_system(system_instruction)
     
-    def generate_response(self, prompt: str) -> str:
+    def generate_response(
+        self,
+        prompt: str,
+        json_mode: bool = False,
+        system_instruction: Optional[str] = None
+    ) -> str:
         """
         Send prompt to Gemini and get raw response.
         
         Args:
-            prompt: The complete prompt (system + user context)
+            prompt: The complete prompt, or just the user part when
+                system_instruction is given
+            json_mode: Request JSON output (if the model supports it, see
+                GEMINI_JSON_MODE)
+            system_instruction: Optional system prompt, sent separately
             
         Returns:
             Raw text response from LLM
@@ -65,11 +170,109 @@ class GeminiService:
             Exception: If API call fails
         """
         try:
-            response = self.model.generate_content(prompt)
+            generation_config = self.json_generation_config if json_mode else None
+            model = self._get_model(system_instruction)
+            response = model.generate_content(prompt, generation_config=generation_config)
             return response.text
         except Exception as e:
             raise Exception(f"Gemini API error: {str(e)}")
     
+    async def agenerate_response(
+        self,
+        prompt: str,
+        json_mode: bool = False,
+        system_instruction: Optional[str] = None
+    ) -> str:
+        """
+        Async variant of generate_response.
+        
+        Uses the SDK's async client so the event loop stays free
+        while Gemini generates the answer.
+        
+        Args:
+            prompt: The complete prompt, or just the user part when
+                system_instruction is given
+            json_mode: Request JSON output (if the model supports it, see
+                GEMINI_JSON_MODE)
+            system_instruction: Optional system prompt, sent separately
+            
+        Returns:
+            Raw text response from LLM
+            
+        Raises:
+            Exception: If API call fails
+        """
+        try:
+            generation_config = self.json_generation_config if json_mode else None
+            model = self._get_model(system_instruction)
+            response = await model.generate_content_async(prompt, generation_config=generation_config)
+            return response.text
+        except Exception as e:
+            raise Exception(f"Gemini API error: {str(e)}")
+    
+    async def awarmup(self) -> None:
+        """
+        Open the async API connection before the first real request.
+        
+        The SDK keeps a single long-lived gRPC channel per process
+        (HTTP/2, multiplexed across concurrent calls), but creates it
+        lazily. count_tokens is free, so calling it once at startup pays
+        the TCP/TLS handshake and auth setup before any user is waiting.
+        """
+        await self.model.count_tokens_async("warmup")
+    
+    async def astream_response(self, prompt: str) -> AsyncIterator[str]:
+        """
+        Stream the Gemini response as text chunks arrive.
+        
+        The caller sees the first tokens after the model's
+        time-to-first-token instead of waiting for the full answer.
+        
+        Args:
+            prompt: The complete prompt (system + user context)
+            
+        Yields:
+            Text chunks in generation order
+            
+        Raises:
+            Exception: If API call fails
+        """
+        try:
+            response = await self.model.generate_content_async(prompt, stream=True)
+            async for chunk in response:
+                if chunk.text:
+                    yield chunk.text
+        except Exception as e:
+            raise Exception(f"Gemini API error: {str(e)}")
+    
+    def extract_json_text(self, response_text: str) -> str:
+        """
+        Locate the JSON object in an LLM response without parsing it.
+        
+        Strips a markdown code fence if present and slices from the
+        first '{' to the last '}'. This is the usual shape of the
+        output, found with C-level str.find/rfind, and the slice can be
+        handed straight to a JSON validator.
+        
+        Args:
+            response_text: Raw LLM response text
+            
+        Returns:
+            Candidate JSON text (not guaranteed to be valid JSON)
+        """
+        text = response_text.strip()
+        if text.startswith("{") and text.endswith("}"):
+            # Happy path: bare JSON object, nothing to search for
+            return text
+        
+        text = _strip_code_fence(text)
+        start = text.find("{")
+        if start == -1:
+            # Assume entire response is JSON
+            return text
+        end = text.rfind("}") + 1
+        return text[start:end] if end > start else text[start:]
+    
     def extract_json_from_response(self, response_text: str) -> Dict[str, Any]:
         """
         Extract and parse JSON from LLM response.
@@ -89,57 +292,109 @@ class GeminiService:
         Raises:
             ValueError: If no valid JSON found
         """
-        # Try to find JSON in markdown code block
-        json_match = re.search(r'```(?:json)?\s*(\{.*?\})\s*```', response_text, re.DOTALL)
-        if json_match:
-            json_str = json_match.group(1)
-        else:
-            # Try to find raw JSON object
-            json_match = re.search(r'\{.*\}', response_text, re.DOTALL)
-            if json_match:
-                json_str = json_match.group(0)
-            else:
-                # Assume entire response is JSON
-                json_str = response_text.strip()
-        
+        json_str = self.extract_json_text(response_text)
         try:
-            return json.loads(json_str)
-        except json.JSONDecodeError as e:
-            raise ValueError(f"Failed to parse JSON from LLM response: {str(e)}\nResponse: {response_text[:200]}...")
+            return orjson.loads(json_str)
+        except orjson.JSONDecodeError as e:
+            error = e
+        
+        # Trailing text contained another '}': scan for the matching brace
+        end = _balanced_object_end(json_str, 0) if json_str.startswith("{") else None
+        if end:
+            try:
+                return orjson.loads(json_str[:end])
+            except orjson.JSONDecodeError as e:
+                error = e
+        
+        raise ValueError(f"Failed to parse JSON from LLM response: {str(error)}\nResponse: {response_text[:200]}...")
     
-    def generate_structured_response(self, prompt: str, request_id: str = "llm") -> Dict[str, Any]:
+    def generate_structured_response(
+        self,
+        prompt: str,
+        request_id: str = "llm",
+        system_instruction: Optional[str] = None
+    ) -> Dict[str, Any]:
         """
         Generate response and extract JSON in one call.
         
         Convenience method combining generate_response and extract_json_from_response.
         
         Args:
-            prompt: The complete prompt
+            prompt: The complete prompt (or user part, see system_instruction)
             request_id: Request ID for tracing
+            system_instruction: Optional system prompt, sent separately
             
         Returns:
             Parsed JSON dictionary
         """
-        print(f"[{request_id}]   → Sub-step 3.1: Sending request to Gemini API...")
-        raw_response = self.generate_response(prompt)
-        print(f"[{request_id}]     • Response length: {len(raw_response)} characters")
-        print(f"[{request_id}]   → Sub-step 3.2: Extracting JSON from response...")
+        logger.info("[%s]   → Sub-step 3.1: Sending request to Gemini API...", request_id)
+        raw_response = self.generate_response(prompt, json_mode=True, system_instruction=system_instruction)
+        logger.info("[%s]     • Response length: %d characters", request_id, len(raw_response))
+        logger.info("[%s]   → Sub-step 3.2: Extracting JSON from response...", request_id)
         json_response = self.extract_json_from_response(raw_response)
-        print(f"[{request_id}]     • Found {len(json_response)} JSON fields")
+        logger.info("[%s]     • Found %d JSON fields", request_id, len(json_response))
         return json_response
+    
+    async def agenerate_structured_response(
+        self,
+        prompt: str,
+        request_id: str = "llm",
+        system_instruction: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Async variant of generate_structured_response.
+        
+        Args:
+            prompt: The complete prompt (or user part, see system_instruction)
+            request_id: Request ID for tracing
+            system_instruction: Optional system prompt, sent separately
+            
+        Returns:
+            Parsed JSON dictionary
+        """
+        logger.info("[%s]   → Sub-step 3.1: Sending request to Gemini API...", request_id)
+        raw_response = await self.agenerate_response(prompt, json_mode=True, system_instruction=system_instruction)
+        logger.info("[%s]     • Response length: %d characters", request_id, len(raw_response))
+        logger.info("[%s]   → Sub-step 3.2: Extracting JSON from response...", request_id)
+        json_response = self.extract_json_from_response(raw_response)
+        logger.info("[%s]     • Found %d JSON fields", request_id, len(json_response))
+        return json_response
+    
+    async def agenerate_json_text(
+        self,
+        prompt: str,
+        request_id: str = "llm",
+        system_instruction: Optional[str] = None
+    ) -> str:
+        """
+        Generate a response and return its JSON object as unparsed text.
+        
+        For callers that validate the JSON directly with Pydantic
+        (model_validate_json), skipping the intermediate dict.
+        
+        Args:
+            prompt: The complete prompt (or user part, see system_instruction)
+            request_id: Request ID for tracing
+            system_instruction: Optional system prompt, sent separately
+            
+        Returns:
+            Candidate JSON text, see extract_json_text
+        """
+        logger.info("[%s]   → Sub-step 3.1: Sending request to Gemini API...", request_id)
+        raw_response = await self.agenerate_response(prompt, json_mode=True, system_instruction=system_instruction)
+        logger.info("[%s]     • Response length: %d characters", request_id, len(raw_response))
+        logger.info("[%s]   → Sub-step 3.2: Extracting JSON from response...", request_id)
+        json_text = self.extract_json_text(raw_response)
+        logger.info("[%s]     • JSON length: %d characters", request_id, len(json_text))
+        return json_text
 
 
-# Singleton instance for reuse across requests
-_gemini_service_instance = None
-
-
+@functools.cache
 def get_gemini_service() -> GeminiService:
     """
     Get singleton instance of GeminiService.
     
-    Avoids recreating model on every request.
+    Avoids recreating model on every request. Built during startup, so
+    requests only ever hit the cached instance.
     """
-    global _gemini_service_instance
-    if _gemini_service_instance is None:
-        _gemini_service_instance = GeminiService()
-    return _gemini_service_instance
+    return GeminiService()
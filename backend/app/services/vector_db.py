@@ -4,17 +4,237 @@ Vector Database Service using ChromaDB for persistent storage.
 This replaces the in-memory vector store with a real database.
 """
 
+import asyncio
+import functools
+import hashlib
+import logging
 import os
+import sqlite3
+import threading
+import time
 import warnings
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple
 import chromadb
+import numpy as np
+from anyio import to_thread
 from chromadb.config import Settings
-from sentence_transformers import SentenceTransformer
+from langchain_text_splitters import RecursiveCharacterTextSplitter
 from app.config import settings
+from app.logger import logger
+from app.services.embeddings import load_sentence_transformer
 
 # Suppress ChromaDB telemetry warnings
 warnings.filterwarnings('ignore', category=UserWarning, module='chromadb')
 
+# documents_meta rows are looked up by id/metadata only, but ChromaDB
+# requires an embedding per row
+_META_EMBEDDING = [0.0]
+
+# HNSW index settings for the chunk collection. Chroma only applies them
+# when a collection is created. Denser graph (M) and wider construction/
+# search beams than Chroma's 16/100/10 keep recall up on large corpora.
+_HNSW_PARAMS = {
+    "hnsw:space": "cosine",
+    "hnsw:M": 32,
+    "hnsw:construction_ef": 200,
+    "hnsw:search_ef": 64,
+    "hnsw:num_threads": os.cpu_count() or 1,
+}
+
+# Default chunking: ~1000-char chunks with 100 chars of overlap
+_CHUNK_SIZE = 1000
+_CHUNK_OVERLAP = 100
+
+
+def _make_splitter(chunk_size: int, overlap: int) -> RecursiveCharacterTextSplitter:
+    """Splitter that breaks on paragraphs, then lines, sentences and words."""
+    return RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=overlap,
+        separators=["\n\n", "\n", ". ", " ", ""],
+        # Keep punctuation with the sentence it ends
+        keep_separator="end"
+    )
+
+
+# Built once; split_text holds no per-call state
+_SPLITTER = _make_splitter(_CHUNK_SIZE, _CHUNK_OVERLAP)
+
+# Candidates fetched per requested result when MMR re-ranking is enabled
+_MMR_FETCH_FACTOR = 5
+
+
+def _mmr_select(
+    query_embedding: np.ndarray,
+    candidate_embeddings: np.ndarray,
+    top_k: int,
+    lambda_mult: float
+) -> List[int]:
+    """
+    Pick top_k diverse candidates with Maximal Marginal Relevance.
+    
+    Overlapping chunks of one document tend to fill the whole top_k
+    with near-duplicates. MMR trades relevance to the query against
+    similarity to what was already picked. All similarities are
+    computed up front as two matrix products; each step is then a few
+    vectorized numpy operations, with no per-candidate Python loop.
+    
+    Args:
+        query_embedding: Unit-length query vector, shape (dim,)
+        candidate_embeddings: Unit-length candidate vectors, shape (n, dim)
+        top_k: Number of candidates to select
+        lambda_mult: 1.0 = pure relevance, 0.0 = pure diversity
+        
+    Returns:
+        Indices into candidate_embeddings, in selection order
+    """
+    query_similarity = candidate_embeddings @ query_embedding
+    pairwise_similarity = candidate_embeddings @ candidate_embeddings.T
+    
+    first = int(np.argmax(query_similarity))
+    selected = [first]
+    available = np.ones(len(candidate_embeddings), dtype=bool)
+    available[first] = False
+    # Highest similarity of each candidate to anything selected so far
+    redundancy = pairwise_similarity[first].copy()
+    
+    while len(selected) < min(top_k, len(candidate_embeddings)):
+        scores = lambda_mult * query_similarity - (1 - lambda_mult) * redundancy
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        np.maximum(redundancy, pairwise_similarity[best], out=redundancy)
+    
+    return selected
+
+
+# Chunks encoded and written to ChromaDB per step during ingestion
+_WRITE_BATCH_SIZE = 1000
+
+
+# SQLite bound-parameter limit is 999 on older builds
+_CACHE_LOOKUP_BATCH = 500
+
+
+def _remove_text_caches(metadatas: Optional[List[Dict[str, Any]]]) -> None:
+    """
+    Delete the cached extracted text (PDF_TEXT_CACHE_DIR) of documents.
+    
+    Deleted documents should not leave their text behind on disk. An
+    identical PDF uploaded as another document shares the entry, and
+    just gets parsed again next time.
+    """
+    for metadata in metadatas or []:
+        path = metadata.get("text_cache")
+        if path:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning("[VectorDB] Could not remove cached text %s: %s", path, e)
+
+
+class ChunkEmbeddingCache:
+    """
+    On-disk cache of chunk embeddings, keyed by a hash of the chunk text.
+    
+    Revised documents and documents built from a template share many
+    byte-identical chunks. Their embeddings are looked up here instead
+    of being recomputed. Keys are blake2b digests of the text together
+    with an identifier of the embedding model configuration, so switching
+    models (or backends) never returns stale vectors. Values are the
+    normalized float32 embeddings as raw bytes.
+    
+    The table is capped at max_rows, evicting the least recently used
+    rows. Rows outlive the documents they came from on purpose: the
+    usual re-index flow deletes a document and uploads a revision of it,
+    which should hit the cache.
+    """
+    
+    def __init__(self, path: str, model_id: str, max_rows: int = 100_000):
+        """
+        Args:
+            path: SQLite database file
+            model_id: Identifies the model configuration the vectors came from
+            max_rows: Maximum number of cached embeddings
+        """
+        self._model_prefix = model_id.encode() + b"\0"
+        self.max_rows = max_rows
+        # Shared by the upload worker threads; access is serialized by the lock
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunk_embeddings ("
+            "key BLOB PRIMARY KEY, embedding BLOB NOT NULL, last_used REAL NOT NULL DEFAULT 0)"
+        )
+        # Caches created before eviction existed lack the column
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(chunk_embeddings)")}
+        if "last_used" not in columns:
+            self._conn.execute("ALTER TABLE chunk_embeddings ADD COLUMN last_used REAL NOT NULL DEFAULT 0")
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS chunk_embeddings_last_used ON chunk_embeddings (last_used)"
+        )
+        self._conn.commit()
+        # Running row count, so inserts don't have to COUNT(*) the table
+        self._rows = self._conn.execute("SELECT COUNT(*) FROM chunk_embeddings").fetchone()[0]
+        self._lock = threading.Lock()
+    
+    def key(self, text: str) -> bytes:
+        """Content hash of a chunk for this model configuration."""
+        return hashlib.blake2b(self._model_prefix + text.encode(), digest_size=16).digest()
+    
+    def get_many(self, keys: List[bytes]) -> Dict[bytes, np.ndarray]:
+        """Return the cached embeddings for whichever keys are present."""
+        found = {}
+        unique_keys = list(dict.fromkeys(keys))
+        now = time.time()
+        with self._lock, self._conn:
+            for start in range(0, len(unique_keys), _CACHE_LOOKUP_BATCH):
+                batch = unique_keys[start:start + _CACHE_LOOKUP_BATCH]
+                placeholders = ','.join('?' * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, embedding FROM chunk_embeddings WHERE key IN ({placeholders})",
+                    batch
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32)
+                if rows:
+                    # Hits count as uses for LRU eviction
+                    self._conn.execute(
+                        f"UPDATE chunk_embeddings SET last_used = ? WHERE key IN ({placeholders})",
+                        [now, *batch]
+                    )
+        return found
+    
+    def put_many(self, items: Dict[bytes, np.ndarray]) -> None:
+        """Store embeddings by key (existing keys are left as they are)."""
+        now = time.time()
+        with self._lock, self._conn:
+            # total_changes counts only the rows actually inserted (not ignored)
+            changes_before = self._conn.total_changes
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO chunk_embeddings (key, embedding, last_used) VALUES (?, ?, ?)",
+                [(key, np.asarray(embedding, dtype=np.float32).tobytes(), now) for key, embedding in items.items()]
+            )
+            self._rows += self._conn.total_changes - changes_before
+            
+            # Evict least recently used rows beyond the cap
+            excess = self._rows - self.max_rows
+            if excess > 0:
+                self._conn.execute(
+                    "DELETE FROM chunk_embeddings WHERE key IN "
+                    "(SELECT key FROM chunk_embeddings ORDER BY last_used LIMIT ?)",
+                    (excess,)
+                )
+                self._rows -= excess
+    
+    def close(self) -> None:
+        """Close the database connection."""
+        with self._lock:
+            self._conn.close()
+
 
 class VectorDBService:
     """
@@ -52,13 +272,52 @@ class VectorDBService:
         # Get or create collection for documents
         self.collection = self.client.get_or_create_collection(
             name="documents",
-            metadata={"description": "User uploaded documents"}
+            metadata={"description": "User uploaded documents", **_HNSW_PARAMS}
         )
+        # The space is fixed when a collection is created, so databases
+        # created before this change still use squared L2. With unit-length
+        # embeddings that is 2 - 2*cos, and similarity is recovered from it.
+        self.distance_space = (self.collection.metadata or {}).get("hnsw:space", "l2")
+        
+        # One row per document (not per chunk), so listing and counting
+        # documents doesn't read every chunk. Rows carry a placeholder
+        # embedding and are only ever fetched by metadata.
+        self.documents_meta = self.client.get_or_create_collection(
+            name="documents_meta",
+            metadata={"description": "One entry per uploaded document"},
+            embedding_function=None
+        )
+        if self.documents_meta.count() == 0 and self.collection.count() > 0:
+            self._backfill_documents_meta()
         
         # Initialize embedding model (same as before)
-        self.embedding_model = SentenceTransformer(settings.embedding_model_name)
+        self.embedding_model = load_sentence_transformer()
+        
+        # Content-addressed chunk embeddings, so re-uploaded or revised
+        # documents only encode the chunks that actually changed
+        self._chunk_cache = None
+        if settings.embedding_cache:
+            self._chunk_cache = ChunkEmbeddingCache(
+                os.path.join(persist_directory, "chunk_embeddings.sqlite3"),
+                model_id="|".join(map(str, (
+                    settings.embedding_model_name,
+                    settings.embedding_backend,
+                    settings.embedding_model_file,
+                    settings.embedding_quantize,
+                ))),
+                max_rows=settings.embedding_cache_max_rows
+            )
+        
+        # Multi-process encode pool for ingestion, started on first use
+        # when EMBEDDING_POOL_DEVICES is set
+        self._encode_pool = None
+        self._encode_pool_lock = threading.Lock()
         
-        print(f"[VectorDB] Initialized with {self.collection.count()} documents")
+        # Bumped on every add/delete so caches built on search results
+        # (e.g. the Q&A answer cache) know when they are stale
+        self.revision = 0
+        
+        logger.info("[VectorDB] Initialized with %d chunks", self.collection.count())
     
     def add_document(self, document_id: str, text: str, metadata: Dict[str, Any]) -> None:
         """
@@ -69,43 +328,195 @@ class VectorDBService:
             text: Full text content of the document
             metadata: Additional metadata (filename, upload_date, etc.)
         """
-        print(f"      → Chunking document...")
-        # Split document into chunks for better retrieval
-        chunks = self._chunk_text(text)
-        print(f"        • Created {len(chunks)} chunks")
-        
-        print(f"      → Generating embeddings with sentence-transformers...")
-        # Generate embeddings for each chunk
-        embeddings = self.embedding_model.encode(chunks).tolist()
-        print(f"        • Generated {len(embeddings)} embeddings")
+        self.add_documents([(document_id, text, metadata)])
+    
+    def add_documents(self, documents: List[Tuple[str, str, Dict[str, Any]]]) -> None:
+        """
+        Add several documents to the vector database at once.
         
-        # Create unique IDs for each chunk
-        chunk_ids = [f"{document_id}_chunk_{i}" for i in range(len(chunks))]
+        Chunks from every document are embedded together (instead of one
+        encode call per document) and written to ChromaDB in slices of
+        up to _WRITE_BATCH_SIZE chunks.
         
-        # Add metadata to each chunk
-        chunk_metadata = [
-            {
+        Args:
+            documents: (document_id, text, metadata) tuples
+        """
+        logger.info("      → Chunking %d document(s)...", len(documents))
+        # Split documents into chunks for better retrieval
+        all_chunks: List[str] = []
+        chunk_ids: List[str] = []
+        chunk_metadata: List[Dict[str, Any]] = []
+        for document_id, text, metadata in documents:
+            chunks = self._chunk_text(text)
+            all_chunks.extend(chunks)
+            # Create unique IDs and per-chunk metadata for each chunk
+            chunk_ids.extend(f"{document_id}_chunk_{i}" for i in range(len(chunks)))
+            # Fields shared by every chunk are merged once; each chunk
+            # then only copies this dict and adds its index
+            base_metadata = {
                 **metadata,
                 "document_id": document_id,
-                "chunk_index": i,
                 "total_chunks": len(chunks)
             }
-            for i in range(len(chunks))
-        ]
+            chunk_metadata.extend(
+                {**base_metadata, "chunk_index": i}
+                for i in range(len(chunks))
+            )
+        logger.info("        • Created %d chunks", len(all_chunks))
+        
+        logger.info("      → Generating embeddings and storing in ChromaDB...")
+        # Encode and write in fixed-size slices: memory stays flat for very
+        # large documents and each SQLite transaction has a bounded size
+        try:
+            for offset in range(0, len(all_chunks), _WRITE_BATCH_SIZE):
+                batch = slice(offset, offset + _WRITE_BATCH_SIZE)
+                embeddings = self._encode_chunks(all_chunks[batch])
+                self.collection.add(
+                    ids=chunk_ids[batch],
+                    embeddings=embeddings,
+                    documents=all_chunks[batch],
+                    metadatas=chunk_metadata[batch]
+                )
+        except Exception:
+            # Without a documents_meta row, slices already written could
+            # never be listed or deleted but would still match searches
+            document_ids = [document_id for document_id, _, _ in documents]
+            self.collection.delete(where={"document_id": {"$in": document_ids}})
+            self.revision += 1
+            raise
+        logger.info("        • Stored %d embeddings", len(all_chunks))
         
-        print(f"      → Storing in ChromaDB...")
-        # Add to ChromaDB
-        self.collection.add(
-            ids=chunk_ids,
-            embeddings=embeddings,
-            documents=chunks,
-            metadatas=chunk_metadata
+        self.documents_meta.upsert(
+            ids=[document_id for document_id, _, _ in documents],
+            embeddings=[_META_EMBEDDING] * len(documents),
+            metadatas=[
+                {**metadata, "document_id": document_id}
+                for document_id, _, metadata in documents
+            ]
         )
+        self.revision += 1
+        
+        logger.info("      ✓ Document(s) stored successfully")
+    
+    def _encode_chunks(self, chunks: List[str]) -> List[List[float]]:
+        """
+        Embed document chunks for storage, reusing cached embeddings.
+        
+        Chunks whose text was embedded before (see ChunkEmbeddingCache)
+        are served from the cache; only the rest, deduplicated, are
+        passed to the model.
+        
+        Args:
+            chunks: Chunk texts
+            
+        Returns:
+            Normalized embeddings, one per chunk
+        """
+        if self._chunk_cache is None:
+            return self._encode_texts(chunks).tolist()
+        
+        keys = [self._chunk_cache.key(chunk) for chunk in chunks]
+        embeddings = self._chunk_cache.get_many(keys)
+        
+        missing = {key: chunk for key, chunk in zip(keys, chunks) if key not in embeddings}
+        logger.debug("        • Reusing %d of %d chunk embeddings from cache",
+                     len(chunks) - len(missing), len(chunks))
+        if missing:
+            encoded = dict(zip(missing, self._encode_texts(list(missing.values()))))
+            self._chunk_cache.put_many(encoded)
+            embeddings.update(encoded)
+        
+        return [embeddings[key].tolist() for key in keys]
+    
+    def _encode_texts(self, chunks: List[str]) -> np.ndarray:
+        """
+        Run the embedding model over chunk texts.
+        
+        With EMBEDDING_POOL_DEVICES set, the chunks are split across one
+        worker process per device (sentence-transformers' multi-process
+        pool), which scales ingestion roughly linearly with GPU count.
+        EMBEDDING_POOL_CPU_WORKERS does the same with CPU-only workers,
+        so large uploads use every core without contending with query
+        encoding in this process.
+        
+        Args:
+            chunks: Chunk texts
+            
+        Returns:
+            Normalized embeddings, shape (len(chunks), dim)
+        """
+        pool = self._get_encode_pool()
+        if pool is not None:
+            embeddings = self.embedding_model.encode_multi_process(
+                chunks,
+                pool,
+                batch_size=settings.embedding_batch_size,
+                normalize_embeddings=True
+            )
+        else:
+            embeddings = self.embedding_model.encode(
+                chunks,
+                batch_size=settings.embedding_batch_size,
+                show_progress_bar=False,
+                convert_to_numpy=True,
+                normalize_embeddings=True
+            )
+        # fp16 models (CUDA) return float16; store and cache float32
+        return embeddings.astype(np.float32, copy=False)
+    
+    def _get_encode_pool(self) -> Optional[Dict[str, Any]]:
+        """Start the multi-process encode pool on first use, if configured."""
+        if settings.embedding_pool_devices:
+            devices = [device.strip() for device in settings.embedding_pool_devices.split(",")]
+        elif settings.embedding_pool_cpu_workers:
+            devices = ["cpu"] * settings.embedding_pool_cpu_workers
+        else:
+            return None
+        with self._encode_pool_lock:
+            if self._encode_pool is None:
+                self._encode_pool = self._start_encode_pool(devices)
+                logger.info("[VectorDB] Started encode pool on %s", ", ".join(devices))
+            return self._encode_pool
+    
+    def _start_encode_pool(self, devices: List[str]) -> Dict[str, Any]:
+        """
+        Spawn the encode worker processes.
         
-        print(f"        • Total documents in DB: {self.collection.count()}")
-        print(f"      ✓ Document stored successfully")
+        Each CPU worker would otherwise start one intra-op thread per
+        core, so N workers would oversubscribe the machine N times over.
+        Workers are spawned with OMP_NUM_THREADS set to their share of
+        the cores; this process's environment is restored afterwards.
+        """
+        cpu_workers = devices.count("cpu")
+        if not cpu_workers:
+            return self.embedding_model.start_multi_process_pool(devices)
+        
+        previous = os.environ.get("OMP_NUM_THREADS")
+        os.environ["OMP_NUM_THREADS"] = str(max(1, (os.cpu_count() or 1) // cpu_workers))
+        try:
+            return self.embedding_model.start_multi_process_pool(devices)
+        finally:
+            if previous is None:
+                del os.environ["OMP_NUM_THREADS"]
+            else:
+                os.environ["OMP_NUM_THREADS"] = previous
+    
+    def close(self) -> None:
+        """Stop the multi-process encode pool and close the chunk cache."""
+        with self._encode_pool_lock:
+            if self._encode_pool is not None:
+                self.embedding_model.stop_multi_process_pool(self._encode_pool)
+                self._encode_pool = None
+        if self._chunk_cache is not None:
+            self._chunk_cache.close()
     
-    def search(self, query: str, top_k: int = 5, document_id: str = None) -> List[Dict[str, Any]]:
+    def search(
+        self,
+        query: str,
+        top_k: int = 5,
+        document_id: str = None,
+        query_embedding: Optional[np.ndarray] = None
+    ) -> List[Dict[str, Any]]:
         """
         Semantic search across documents.
         
@@ -113,41 +524,150 @@ class VectorDBService:
             query: Search query
             top_k: Number of results to return
             document_id: Optional filter to search within specific document
+            query_embedding: Embedding of the query, if the caller already has one
             
         Returns:
             List of search results with text, metadata, and similarity scores
         """
-        print(f"        • Encoding query with embedding model...")
-        # Generate query embedding
-        query_embedding = self.embedding_model.encode([query])[0].tolist()
+        return self.search_batch(
+            [query],
+            top_k=top_k,
+            document_id=document_id,
+            query_embeddings=[query_embedding]
+        )[0]
+    
+    def search_batch(
+        self,
+        queries: List[str],
+        top_k: int = 5,
+        document_id: str = None,
+        query_embeddings: Optional[List[Optional[np.ndarray]]] = None
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Semantic search for several queries at once.
+        
+        All queries are embedded in one batch and sent to ChromaDB in a
+        single query call, which is much cheaper than one encode + one
+        query per question.
+        
+        Args:
+            queries: Search queries
+            top_k: Number of results to return per query
+            document_id: Optional filter to search within specific document
+            query_embeddings: Optional precomputed embedding per query
+                (None entries are embedded here)
+            
+        Returns:
+            One list of search results per query, in input order
+        """
+        query_embeddings = self._embed_queries(queries, query_embeddings)
         
         # Build filter if document_id provided
         where_filter = {"document_id": document_id} if document_id else None
         
-        print(f"        • Searching ChromaDB (top_k={top_k})...")
+        # With MMR enabled, over-fetch candidates (and their embeddings)
+        # and pick a diverse top_k from them below
+        use_mmr = settings.retrieval_mmr_lambda is not None
+        n_results = top_k * _MMR_FETCH_FACTOR if use_mmr else top_k
+        include = ["documents", "metadatas", "distances"]
+        if use_mmr:
+            include.append("embeddings")
+        
+        logger.debug("        • Searching ChromaDB (top_k=%d)...", top_k)
         # Search ChromaDB
         results = self.collection.query(
-            query_embeddings=[query_embedding],
-            n_results=top_k,
-            where=where_filter
+            query_embeddings=query_embeddings,
+            n_results=n_results,
+            where=where_filter,
+            include=include
         )
         
         # Format results
-        formatted_results = []
-        if results['ids'] and len(results['ids']) > 0:
-            for i in range(len(results['ids'][0])):
-                formatted_results.append({
-                    "text": results['documents'][0][i],
-                    "metadata": results['metadatas'][0][i],
-                    "distance": results['distances'][0][i] if 'distances' in results else None,
-                    "similarity_score": 1 - results['distances'][0][i] if 'distances' in results else None
-                })
-        
-        print(f"        • Found {len(formatted_results)} results")
-        if formatted_results and 'distances' in results:
-            avg_distance = sum(results['distances'][0]) / len(results['distances'][0])
-            print(f"        • Average similarity: {1 - avg_distance:.2%}")
-        return formatted_results
+        batch_results = []
+        for q in range(len(queries)):
+            formatted_results = []
+            if results['ids'] and len(results['ids']) > q:
+                if use_mmr and results['ids'][q]:
+                    order = _mmr_select(
+                        np.asarray(query_embeddings[q], dtype=np.float32),
+                        np.asarray(results['embeddings'][q], dtype=np.float32),
+                        top_k,
+                        settings.retrieval_mmr_lambda
+                    )
+                else:
+                    order = range(len(results['ids'][q]))
+                for i in order:
+                    formatted_results.append({
+                        "text": results['documents'][q][i],
+                        "metadata": results['metadatas'][q][i],
+                        "distance": results['distances'][q][i] if 'distances' in results else None,
+                        "similarity_score": self._similarity(results['distances'][q][i]) if 'distances' in results else None
+                    })
+            
+            # Per-query stats are for debugging only; skip the math otherwise
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("        • Found %d results", len(formatted_results))
+                if formatted_results and 'distances' in results:
+                    avg_distance = sum(r['distance'] for r in formatted_results) / len(formatted_results)
+                    logger.debug("        • Average similarity: %.2f%%", self._similarity(avg_distance) * 100)
+            batch_results.append(formatted_results)
+        
+        return batch_results
+    
+    def _similarity(self, distance: float) -> float:
+        """Convert a ChromaDB distance to cosine similarity (embeddings are unit length)."""
+        if self.distance_space == "l2":
+            return 1 - distance / 2
+        return 1 - distance
+    
+    def _embed_queries(
+        self,
+        queries: List[str],
+        precomputed: Optional[List[Optional[np.ndarray]]] = None
+    ) -> List[List[float]]:
+        """
+        Embed search queries, reusing embeddings the caller already has.
+        
+        Precomputed embeddings (QAAgent embeds every question for its
+        answer cache) are used as-is, re-normalized only if they aren't
+        unit length already. The remaining queries, deduplicated, are
+        encoded in a single forward pass.
+        
+        Args:
+            queries: Search queries
+            precomputed: Optional embedding per query, None where unknown
+            
+        Returns:
+            One embedding per query, in input order
+        """
+        embeddings = [None] * len(queries)
+        if precomputed is not None:
+            for i, embedding in enumerate(precomputed):
+                if embedding is not None:
+                    embedding = np.asarray(embedding, dtype=np.float32)
+                    norm = np.linalg.norm(embedding)
+                    if abs(norm - 1.0) > 1e-3:
+                        embedding = embedding / (norm + 1e-12)
+                    embeddings[i] = embedding.tolist()
+        
+        missing = list(dict.fromkeys(
+            query for query, embedding in zip(queries, embeddings) if embedding is None
+        ))
+        if not missing:
+            logger.debug("        • Reusing precomputed embeddings for %d query(ies)", len(queries))
+            return embeddings
+        
+        logger.debug("        • Encoding %d query(ies) with embedding model...", len(missing))
+        # Generate query embeddings in a single forward pass
+        encoded = dict(zip(
+            missing,
+            self.embedding_model.encode(missing, normalize_embeddings=True).tolist()
+        ))
+        
+        return [
+            embedding if embedding is not None else encoded[query]
+            for query, embedding in zip(queries, embeddings)
+        ]
     
     def list_documents(self) -> List[Dict[str, Any]]:
         """
@@ -156,23 +676,42 @@ class VectorDBService:
         Returns:
             List of documents with metadata
         """
-        # Get all items
-        all_items = self.collection.get()
+        all_documents = self.documents_meta.get(include=["metadatas"])
+        
+        return [
+            {
+                "document_id": metadata['document_id'],
+                "filename": metadata.get('filename', 'Unknown'),
+                "upload_date": metadata.get('upload_date', 'Unknown'),
+                "file_size": metadata.get('file_size', 0)
+            }
+            for metadata in all_documents['metadatas'] or []
+        ]
+    
+    def _backfill_documents_meta(self) -> None:
+        """
+        Build documents_meta from existing chunks (databases created
+        before it existed). Runs the full chunk scan once, at startup.
+        """
+        all_items = self.collection.get(include=["metadatas"])
         
-        # Extract unique documents
         documents = {}
-        if all_items['metadatas']:
-            for metadata in all_items['metadatas']:
-                doc_id = metadata.get('document_id')
-                if doc_id and doc_id not in documents:
-                    documents[doc_id] = {
-                        "document_id": doc_id,
-                        "filename": metadata.get('filename', 'Unknown'),
-                        "upload_date": metadata.get('upload_date', 'Unknown'),
-                        "file_size": metadata.get('file_size', 0)
-                    }
-        
-        return list(documents.values())
+        for metadata in all_items['metadatas'] or []:
+            doc_id = metadata.get('document_id')
+            if doc_id and doc_id not in documents:
+                # Drop chunk-level fields, keep the document's own metadata
+                documents[doc_id] = {
+                    key: value for key, value in metadata.items()
+                    if key not in ("chunk_index", "total_chunks")
+                }
+        
+        if documents:
+            self.documents_meta.upsert(
+                ids=list(documents),
+                embeddings=[_META_EMBEDDING] * len(documents),
+                metadatas=list(documents.values())
+            )
+            logger.info("[VectorDB] Indexed %d existing documents in documents_meta", len(documents))
     
     def delete_document(self, document_id: str) -> bool:
         """
@@ -184,28 +723,55 @@ class VectorDBService:
         Returns:
             True if deleted, False if not found
         """
-        # Get all chunk IDs for this document
-        results = self.collection.get(
-            where={"document_id": document_id}
-        )
+        # Existence check is a single-row lookup in documents_meta
+        existing = self.documents_meta.get(ids=[document_id], include=["metadatas"])
+        if not existing['ids']:
+            return False
+        
+        # Chunks are deleted by filter inside ChromaDB, without fetching their IDs
+        self.collection.delete(where={"document_id": document_id})
+        self.documents_meta.delete(ids=[document_id])
+        _remove_text_caches(existing['metadatas'])
+        self.revision += 1
+        logger.info("[VectorDB] Deleted document %s", document_id)
+        return True
+    
+    def delete_documents(self, document_ids: List[str]) -> int:
+        """
+        Delete several documents and all their chunks in one operation.
+        
+        One filtered delete per collection instead of one round of
+        deletes (and index updates) per document.
         
-        if results['ids']:
-            self.collection.delete(ids=results['ids'])
-            print(f"[VectorDB] Deleted document {document_id} ({len(results['ids'])} chunks)")
-            return True
+        Args:
+            document_ids: IDs of documents to delete
+            
+        Returns:
+            Number of documents that existed and were deleted
+        """
+        found = self.documents_meta.get(ids=list(document_ids), include=["metadatas"])
+        existing = found['ids']
+        if not existing:
+            return 0
         
-        return False
+        self.collection.delete(where={"document_id": {"$in": existing}})
+        self.documents_meta.delete(ids=existing)
+        _remove_text_caches(found['metadatas'])
+        self.revision += 1
+        logger.info("[VectorDB] Deleted %d documents", len(existing))
+        return len(existing)
     
     def get_document_count(self) -> int:
         """Get total number of unique documents."""
-        return len(self.list_documents())
+        return self.documents_meta.count()
     
-    def _chunk_text(self, text: str, chunk_size: int = 1000, overlap: int = 100) -> List[str]:
+    def _chunk_text(self, text: str, chunk_size: int = _CHUNK_SIZE, overlap: int = _CHUNK_OVERLAP) -> List[str]:
         """
         Split text into overlapping chunks for better retrieval.
         
         Increased from 500 to 1000 chars to preserve more context.
         Overlap ensures important information isn't lost at boundaries.
+        Splits on paragraphs first, then lines, sentences and words.
         
         Args:
             text: Text to chunk
@@ -215,40 +781,113 @@ class VectorDBService:
         Returns:
             List of text chunks
         """
-        if len(text) <= chunk_size:
-            return [text]
-        
-        chunks = []
-        start = 0
+        if chunk_size == _CHUNK_SIZE and overlap == _CHUNK_OVERLAP:
+            return _SPLITTER.split_text(text)
+        return _make_splitter(chunk_size, overlap).split_text(text)
+
+
+class BatchedRetriever:
+    """
+    Micro-batching front end for VectorDBService.search.
+    
+    Concurrent /ask requests each need one query embedding and one
+    ChromaDB lookup. Instead of running them one by one, searches that
+    arrive within a short window (and share the same top_k and
+    document filter) are coalesced into a single search_batch call.
+    Each caller still awaits only its own results.
+    """
+    
+    def __init__(
+        self,
+        vector_db: VectorDBService,
+        window_seconds: float = 0.01,
+        max_batch_size: int = 32
+    ):
+        """
+        Args:
+            vector_db: Service that executes the batched searches
+            window_seconds: How long to wait for more queries to join a batch
+            max_batch_size: Flush immediately once this many queries are waiting
+        """
+        self.vector_db = vector_db
+        self.window_seconds = window_seconds
+        self.max_batch_size = max_batch_size
+        self._pending: Dict[Tuple[int, Optional[str]], List[Tuple[str, Optional[np.ndarray], asyncio.Future]]] = {}
+        self._tasks = set()
+    
+    async def search(
+        self,
+        query: str,
+        top_k: int = 5,
+        document_id: str = None,
+        query_embedding: Optional[np.ndarray] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Queue a search and wait for the batch it lands in.
         
-        while start < len(text):
-            end = start + chunk_size
-            
-            # Try to break at sentence boundary for better context
-            if end < len(text):
-                # Look for sentence ending (prefer period, then other punctuation)
-                for char in ['. ', '.\n', '! ', '!\n', '? ', '?\n']:
-                    last_sentence = text[start:end].rfind(char)
-                    if last_sentence > chunk_size * 0.5:  # At least 50% of chunk_size
-                        end = start + last_sentence + len(char)
-                        break
+        Args:
+            query: Search query
+            top_k: Number of results to return
+            document_id: Optional filter to search within specific document
+            query_embedding: Embedding of the query, if the caller already has one
             
-            chunk = text[start:end].strip()
-            if chunk:  # Only add non-empty chunks
-                chunks.append(chunk)
-            start = end - overlap
+        Returns:
+            List of search results with text, metadata, and similarity scores
+        """
+        loop = asyncio.get_running_loop()
+        key = (top_k, document_id)
+        future = loop.create_future()
         
-        return chunks
+        batch = self._pending.setdefault(key, [])
+        batch.append((query, query_embedding, future))
+        if len(batch) == 1:
+            # First query for this filter opens the batching window
+            loop.call_later(self.window_seconds, self._flush, key, batch)
+        elif len(batch) >= self.max_batch_size:
+            self._flush(key, batch)
         
-        return chunks
-
+        return await future
+    
+    def _flush(self, key: Tuple[int, Optional[str]], batch: List[Tuple[str, Optional[np.ndarray], asyncio.Future]]) -> None:
+        """Hand a pending batch to a background task."""
+        # The window timer can fire after a size-triggered flush already took this batch
+        if self._pending.get(key) is not batch:
+            return
+        del self._pending[key]
+        
+        task = asyncio.ensure_future(self._run_batch(key, batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+    
+    async def _run_batch(self, key: Tuple[int, Optional[str]], batch: List[Tuple[str, Optional[np.ndarray], asyncio.Future]]) -> None:
+        """Run one batched search in the threadpool and resolve every waiter."""
+        top_k, document_id = key
+        queries = [query for query, _, _ in batch]
+        embeddings = [embedding for _, embedding, _ in batch]
+        
+        try:
+            results = await to_thread.run_sync(
+                self.vector_db.search_batch, queries, top_k, document_id, embeddings
+            )
+        except Exception as e:
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        
+        for (_, _, future), result in zip(batch, results):
+            # A waiter may have been cancelled (e.g. client disconnected)
+            if not future.done():
+                future.set_result(result)
 
-# Singleton instance
-_vector_db_service = None
 
+@functools.cache
 def get_vector_db_service() -> VectorDBService:
     """Get or create singleton VectorDBService instance."""
-    global _vector_db_service
-    if _vector_db_service is None:
-        _vector_db_service = VectorDBService()
-    return _vector_db_service
+    return VectorDBService()
+
+
+@functools.cache
+def get_batched_retriever() -> BatchedRetriever:
+    """Get or create singleton BatchedRetriever over the shared VectorDBService."""
+    return BatchedRetriever(get_vector_db_service())
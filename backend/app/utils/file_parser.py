@@ -4,8 +4,54 @@ File parsing utilities for different document formats.
 Supports: .txt, .md, .pdf
 """
 
+import functools
+import hashlib
 import io
+import multiprocessing
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import BinaryIO, List, Optional, Union
 from pypdf import PdfReader
+from pypdf import __version__ as pypdf_version
+from app.utils.pdf_worker import extract_page_text, extract_pages
+
+# PyMuPDF (MuPDF's C parser) extracts text several times faster than
+# pypdf. It is AGPL-licensed, so it stays optional: install pymupdf to
+# use it, otherwise pypdf is used.
+try:
+    import pymupdf
+except ImportError:
+    pymupdf = None
+
+# PDFs with at least this many pages are extracted in parallel (when
+# PDF_PARSE_WORKERS is set); below it, starting workers and copying the
+# file for them costs more than they save
+_PARALLEL_MIN_PAGES = 32
+
+
+@functools.cache
+def _get_pdf_executor() -> ProcessPoolExecutor:
+    """
+    Process pool for PDF page extraction, started on first use.
+    
+    Spawned rather than forked: the API process runs model and
+    database threads that a fork would copy mid-flight. Workers only
+    run app.utils.pdf_worker, which imports nothing but pypdf.
+    """
+    from app.config import settings
+    return ProcessPoolExecutor(
+        max_workers=settings.pdf_parse_workers,
+        mp_context=multiprocessing.get_context("spawn")
+    )
+
+
+def shutdown_pdf_executor() -> None:
+    """Stop the PDF worker processes, if they were started."""
+    if _get_pdf_executor.cache_info().currsize:
+        _get_pdf_executor().shutdown(cancel_futures=True)
+        _get_pdf_executor.cache_clear()
 
 
 class FileParser:
@@ -13,6 +59,26 @@ class FileParser:
     Parse different file formats and extract text content.
     """
     
+    # Built once at class definition; lookups are O(1) set membership
+    _TEXT_EXTENSIONS = frozenset({'txt', 'md', 'markdown'})
+    _SUPPORTED_EXTENSIONS = _TEXT_EXTENSIONS | {'pdf'}
+    
+    @staticmethod
+    def get_extension(filename: str) -> str:
+        """
+        Get a filename's lowercased extension (without the dot).
+        
+        Only the text after the last dot is lowercased; no list of
+        path parts is built.
+        
+        Args:
+            filename: Filename with extension
+            
+        Returns:
+            Extension, or the whole name if it has no dot
+        """
+        return filename.rpartition('.')[2].lower()
+    
     @staticmethod
     def parse_text(content: bytes, filename: str) -> str:
         """
@@ -30,9 +96,9 @@ class FileParser:
             UnicodeDecodeError: If text file is not UTF-8
             Exception: If PDF parsing fails
         """
-        file_ext = filename.lower().split('.')[-1]
+        file_ext = FileParser.get_extension(filename)
         
-        if file_ext in ['txt', 'md', 'markdown']:
+        if file_ext in FileParser._TEXT_EXTENSIONS:
             return FileParser._parse_text_file(content)
         elif file_ext == 'pdf':
             return FileParser._parse_pdf(content)
@@ -42,6 +108,41 @@ class FileParser:
                 "Supported formats: .txt, .md, .pdf"
             )
     
+    @staticmethod
+    def parse_file(file: BinaryIO, filename: str, text_cache_path: Optional[str] = None) -> str:
+        """
+        Parse an open binary file based on file extension.
+        
+        PDFs are never read into one big bytes object: pypdf seeks
+        within the file object as needed, and PyMuPDF and the worker
+        pool read a temporary copy written block by block.
+        
+        Args:
+            file: Binary file object positioned at the start
+            filename: Original filename with extension
+            text_cache_path: Optional cached-text file for a PDF, see
+                text_cache_path()
+            
+        Returns:
+            Extracted text content
+            
+        Raises:
+            ValueError: If file format is unsupported
+            UnicodeDecodeError: If text file is not UTF-8
+            Exception: If PDF parsing fails
+        """
+        file_ext = FileParser.get_extension(filename)
+        
+        if file_ext in FileParser._TEXT_EXTENSIONS:
+            return FileParser._parse_text_file(file.read())
+        elif file_ext == 'pdf':
+            return FileParser._parse_pdf(file, text_cache_path)
+        else:
+            raise ValueError(
+                f"Unsupported file format: .{file_ext}. "
+                "Supported formats: .txt, .md, .pdf"
+            )
+    
     @staticmethod
     def _parse_text_file(content: bytes) -> str:
         """
@@ -56,15 +157,23 @@ class FileParser:
         Raises:
             UnicodeDecodeError: If file is not UTF-8 encoded
         """
+        # Most .txt/.md uploads are pure ASCII: isascii() scans a machine
+        # word at a time, and an ASCII decode is a straight copy
+        if content.isascii():
+            return content.decode('ascii')
         return content.decode('utf-8')
     
     @staticmethod
-    def _parse_pdf(content: bytes) -> str:
+    def _parse_pdf(content: Union[bytes, BinaryIO], cache_path: Optional[str] = None) -> str:
         """
         Extract text from PDF file.
         
+        Uses PyMuPDF when installed, pypdf otherwise.
+        
         Args:
-            content: Raw PDF bytes
+            content: Raw PDF bytes or a seekable binary file object
+            cache_path: Cached-text file to read, or to write after
+                parsing (None skips the cache)
             
         Returns:
             Extracted text from all pages
@@ -72,26 +181,187 @@ class FileParser:
         Raises:
             Exception: If PDF parsing fails
         """
+        if cache_path is not None and os.path.exists(cache_path):
+            with open(cache_path, encoding="utf-8") as cached:
+                return cached.read()
+        
         try:
-            # Create PDF reader from bytes
-            pdf_file = io.BytesIO(content)
-            reader = PdfReader(pdf_file)
+            # Extract text from all pages, in page order
+            if pymupdf is not None:
+                page_texts = FileParser._extract_pages_pymupdf(content)
+            else:
+                page_texts = FileParser._extract_pages_pypdf(content)
             
-            # Extract text from all pages
             text_parts = []
-            for page_num, page in enumerate(reader.pages, 1):
-                page_text = page.extract_text()
-                if page_text.strip():
+            # isspace() stops at the first non-blank character and allocates
+            # nothing, unlike strip() which copies the whole page
+            for page_text in page_texts:
+                if page_text and not page_text.isspace():
                     text_parts.append(page_text)
             
             if not text_parts:
                 raise ValueError("PDF contains no extractable text")
             
             # Join all pages with double newline
-            return "\n\n".join(text_parts)
+            text = "\n\n".join(text_parts)
         
         except Exception as e:
             raise Exception(f"Failed to parse PDF: {str(e)}")
+        
+        if cache_path is not None:
+            FileParser._write_text_cache(cache_path, text)
+        return text
+    
+    @staticmethod
+    def text_cache_path(content: Union[bytes, BinaryIO]) -> Optional[str]:
+        """
+        Path of the cached extracted text for this PDF, if caching is on.
+        
+        Re-uploading the same file (e.g. re-indexing while tuning chunk
+        sizes) then skips PDF parsing. The key is a blake2b hash of the
+        file bytes plus the extractor and its version, so upgrading or
+        switching the parser never serves stale text. The caller keeps
+        the path with the document, so deleting it removes the entry.
+        
+        Args:
+            content: Raw PDF bytes or a seekable binary file object
+            
+        Returns:
+            Cache file path, or None when PDF_TEXT_CACHE_DIR is unset
+        """
+        # Imported here (as elsewhere in this module) so that importing
+        # FileParser for format checks needs no app configuration
+        from app.config import settings
+        if not settings.pdf_text_cache_dir:
+            return None
+        
+        extractor = f"pymupdf-{pymupdf.VersionBind}" if pymupdf is not None else f"pypdf-{pypdf_version}"
+        digest = hashlib.blake2b(extractor.encode(), digest_size=16)
+        if isinstance(content, (bytes, bytearray)):
+            digest.update(content)
+        else:
+            content.seek(0)
+            for block in iter(lambda: content.read(1 << 20), b""):
+                digest.update(block)
+            content.seek(0)
+        return os.path.join(settings.pdf_text_cache_dir, f"{digest.hexdigest()}.txt")
+    
+    @staticmethod
+    def _write_text_cache(cache_path: str, text: str) -> None:
+        """Store extracted text; a failed write only costs a re-parse later."""
+        try:
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            # Write then rename, so a concurrent reader never sees a partial file
+            tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as cached:
+                cached.write(text)
+            os.replace(tmp_path, cache_path)
+        except OSError:
+            pass
+    
+    @staticmethod
+    def _extract_pages_pymupdf(content: Union[bytes, BinaryIO]) -> List[str]:
+        """
+        Extract page text with PyMuPDF.
+        
+        Content streams are parsed in native code, so this runs
+        in-process without the worker pool. MuPDF takes either one
+        in-memory buffer or a file path, so file objects are opened
+        through a temporary copy rather than read into memory whole.
+        
+        Args:
+            content: Raw PDF bytes or a seekable binary file object
+            
+        Returns:
+            Text of every page, in page order
+        """
+        if isinstance(content, (bytes, bytearray)):
+            with pymupdf.open(stream=content, filetype="pdf") as doc:
+                return [page.get_text("text") for page in doc]
+        
+        path = FileParser._copy_to_temp_file(content)
+        try:
+            with pymupdf.open(path, filetype="pdf") as doc:
+                return [page.get_text("text") for page in doc]
+        finally:
+            os.remove(path)
+    
+    @staticmethod
+    def _extract_pages_pypdf(content: Union[bytes, BinaryIO]) -> List[str]:
+        """
+        Extract page text with pypdf.
+        
+        Larger PDFs are split across the worker processes, see
+        _extract_pages_parallel.
+        
+        Args:
+            content: Raw PDF bytes or a seekable binary file object
+            
+        Returns:
+            Text of every page, in page order
+        """
+        # Create PDF reader from bytes or read the file object directly
+        pdf_file = io.BytesIO(content) if isinstance(content, (bytes, bytearray)) else content
+        reader = PdfReader(pdf_file, strict=False)
+        page_count = len(reader.pages)
+        
+        from app.config import settings
+        workers = settings.pdf_parse_workers
+        if workers > 1 and page_count >= _PARALLEL_MIN_PAGES:
+            return FileParser._extract_pages_parallel(content, page_count, workers)
+        return [extract_page_text(page) for page in reader.pages]
+    
+    @staticmethod
+    def _extract_pages_parallel(
+        content: Union[bytes, BinaryIO],
+        page_count: int,
+        workers: int
+    ) -> List[str]:
+        """
+        Extract page text across the worker processes.
+        
+        The PDF is copied once, block by block, into a temporary file
+        that every worker opens by path; each worker is only sent that
+        path and one contiguous page range, never the PDF bytes.
+        
+        Args:
+            content: Raw PDF bytes or a seekable binary file object
+            page_count: Number of pages in the PDF
+            workers: Number of page ranges to split the PDF into
+            
+        Returns:
+            Text of every page, in page order
+        """
+        path = FileParser._copy_to_temp_file(content)
+        try:
+            step = -(-page_count // workers)  # ceil division
+            executor = _get_pdf_executor()
+            futures = [
+                executor.submit(extract_pages, path, start, min(start + step, page_count))
+                for start in range(0, page_count, step)
+            ]
+            return [text for future in futures for text in future.result()]
+        finally:
+            os.remove(path)
+    
+    @staticmethod
+    def _copy_to_temp_file(content: Union[bytes, BinaryIO]) -> str:
+        """
+        Write the PDF to a temporary file, in blocks for file objects.
+        
+        Args:
+            content: Raw PDF bytes or a seekable binary file object
+            
+        Returns:
+            Path of the temporary file (the caller removes it)
+        """
+        with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as copy:
+            if isinstance(content, (bytes, bytearray)):
+                copy.write(content)
+            else:
+                content.seek(0)
+                shutil.copyfileobj(content, copy)
+        return copy.name
     
     @staticmethod
     def get_supported_extensions() -> list[str]:
@@ -99,9 +369,9 @@ class FileParser:
         Get list of supported file extensions.
         
         Returns:
-            List of supported extensions (without dots)
+            Sorted list of supported extensions (without dots)
         """
-        return ['txt', 'md', 'markdown', 'pdf']
+        return sorted(FileParser._SUPPORTED_EXTENSIONS)
     
     @staticmethod
     def is_supported(filename: str) -> bool:
@@ -114,5 +384,4 @@ class FileParser:
         Returns:
             True if supported, False otherwise
         """
-        file_ext = filename.lower().split('.')[-1]
-        return file_ext in FileParser.get_supported_extensions()
+        return FileParser.get_extension(filename) in FileParser._SUPPORTED_EXTENSIONS
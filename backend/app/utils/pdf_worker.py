@@ -0,0 +1,60 @@
+"""
+pypdf page extraction, shared by FileParser and its worker processes.
+
+Worker processes import this module to run extract_pages, so it must
+stay light: pypdf and the standard library only, nothing from app.*
+(settings, services) that would pull in models or databases.
+"""
+
+import logging
+import warnings
+from typing import List
+from pypdf import PageObject, PdfReader
+
+# Malformed-but-readable PDFs make pypdf log and warn for every broken
+# xref entry or object; parsing recovers, so drop the noise (this also
+# applies in the worker processes, which import this module)
+logging.getLogger("pypdf").setLevel(logging.ERROR)
+warnings.filterwarnings("ignore", module="pypdf")
+
+
+def page_may_have_text(page: PageObject) -> bool:
+    """
+    Check a page's resources for anything that can draw text.
+    
+    Text can only be shown with a font, either directly on the page or
+    inside a form XObject. Scanned and image-only pages have neither,
+    and skipping them avoids running pypdf's content-stream
+    interpreter over what can be megabytes of drawing operators.
+    """
+    resources = page.get("/Resources")
+    if resources is None:
+        return False
+    resources = resources.get_object()
+    if "/Font" in resources:
+        return True
+    xobjects = resources.get("/XObject")
+    if xobjects is None:
+        return False
+    return any(
+        xobject.get_object().get("/Subtype") == "/Form"
+        for xobject in xobjects.get_object().values()
+    )
+
+
+def extract_page_text(page: PageObject) -> str:
+    """Extract one page's text, skipping pages that cannot contain any."""
+    return page.extract_text() if page_may_have_text(page) else ""
+
+
+def extract_pages(path: str, start: int, stop: int) -> List[str]:
+    """
+    Extract the text of pages [start, stop) of a PDF file (worker side).
+    
+    Readers aren't picklable, so each worker opens its own on the
+    shared file; pypdf only parses the pages it is asked for.
+    """
+    with open(path, "rb") as pdf_file:
+        # Lenient parsing: recover from broken xrefs instead of raising
+        reader = PdfReader(pdf_file, strict=False)
+        return [extract_page_text(reader.pages[i]) for i in range(start, stop)]
@@ -5,6 +5,16 @@ Run this after installing dependencies to check everything works.
 """
 
 import sys
+from importlib.util import find_spec
+
+
+def _is_installed(package):
+    """Check that a package can be imported, without executing it."""
+    try:
+        return find_spec(package) is not None
+    except ImportError:
+        # A missing parent package, e.g. "google" for google.generativeai
+        return False
 
 
 def check_imports():
@@ -23,10 +33,9 @@ def check_imports():
     
     missing = []
     for package, name in packages:
-        try:
-            __import__(package)
+        if _is_installed(package):
             print(f"  [OK] {name}")
-        except ImportError:
+        else:
             print(f"  [FAIL] {name} - MISSING")
             missing.append(name)
     
@@ -85,9 +94,17 @@ def check_structure():
         "app/templates/index.html",
     ]
     
+    # One walk of app/ instead of a stat() per required path; os.walk
+    # uses scandir, so file/dir type comes from the directory entries
+    existing = {
+        f"{root}/{name}".replace(os.sep, "/")
+        for root, _, files in os.walk("app")
+        for name in files
+    }
+    
     missing = []
     for path in required_paths:
-        if os.path.exists(path):
+        if path in existing:
             print(f"  [OK] {path}")
         else:
             print(f"  [FAIL] {path} - MISSING")
@@ -0,0 +1,94 @@
+"""
+Utility script to export the embedding model to ONNX for fast CPU inference.
+
+This script:
+1. Loads EMBEDDING_MODEL_NAME with the ONNX backend (exporting it if needed)
+2. Saves the model to a local directory
+3. Writes a graph-optimized and/or an int8 dynamically-quantized ONNX file
+
+The result is used through the existing EMBEDDING_BACKEND setting, so
+search and ingestion keep calling encode() exactly as before.
+
+Requires: pip install "optimum[onnxruntime]"
+
+Usage:
+    python export_embedding_model.py                          # int8, AVX-512 VNNI
+    python export_embedding_model.py --quantize avx2          # int8, older x86 CPUs
+    python export_embedding_model.py --quantize arm64         # int8, ARM CPUs
+    python export_embedding_model.py --optimize O3 --quantize ""   # fp32 graph fusion only
+"""
+
+import argparse
+from pathlib import Path
+from sentence_transformers import (
+    SentenceTransformer,
+    export_dynamic_quantized_onnx_model,
+    export_optimized_onnx_model,
+)
+from app.config import settings
+
+
+def export_model(output_dir: Path, quantize: str, optimize: str) -> None:
+    """Export the configured embedding model to ONNX in output_dir."""
+    print("\n" + "="*70)
+    print("EXPORT EMBEDDING MODEL TO ONNX")
+    print("="*70 + "\n")
+
+    print(f"Loading {settings.embedding_model_name} with the ONNX backend...")
+    model = SentenceTransformer(settings.embedding_model_name, backend="onnx")
+    model.save(str(output_dir))
+    print(f"   ✓ Saved to {output_dir}")
+
+    model_file = "onnx/model.onnx"
+
+    if optimize:
+        print(f"Optimizing graph ({optimize})...")
+        export_optimized_onnx_model(model, optimize, str(output_dir))
+        model_file = f"onnx/model_{optimize}.onnx"
+        print(f"   ✓ Wrote {model_file}")
+
+    if quantize:
+        print(f"Quantizing to int8 ({quantize})...")
+        export_dynamic_quantized_onnx_model(model, quantize, str(output_dir))
+        model_file = f"onnx/model_qint8_{quantize}.onnx"
+        print(f"   ✓ Wrote {model_file}")
+
+    print("\nExport complete! Add to your .env:\n")
+    print(f"  EMBEDDING_MODEL_NAME={output_dir.resolve()}")
+    print("  EMBEDDING_BACKEND=onnx")
+    print(f"  EMBEDDING_MODEL_FILE={model_file}\n")
+    print("Then re-index documents (python reindex_documents.py --clear) if you")
+    print("want stored chunks embedded by the same model as new queries.\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Export the embedding model to ONNX (optimized and/or int8-quantized)",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  python export_embedding_model.py                      # int8 for AVX-512 VNNI CPUs
+  python export_embedding_model.py --quantize avx2      # int8 for AVX2 CPUs
+  python export_embedding_model.py --optimize O3 --quantize ""
+        """
+    )
+
+    parser.add_argument('--output', default='onnx_model',
+                       help='Directory to write the exported model to (default: onnx_model)')
+    parser.add_argument('--quantize', default='avx512_vnni',
+                       choices=['arm64', 'avx2', 'avx512', 'avx512_vnni', ''],
+                       help='int8 dynamic quantization target ("" to skip)')
+    parser.add_argument('--optimize', default='',
+                       choices=['O1', 'O2', 'O3', 'O4', ''],
+                       help='ONNX Runtime graph optimization level (O4 is GPU-only)')
+
+    args = parser.parse_args()
+
+    if not args.quantize and not args.optimize:
+        parser.error("nothing to do: pass --quantize and/or --optimize")
+
+    export_model(Path(args.output), args.quantize, args.optimize)
+
+
+if __name__ == "__main__":
+    main()
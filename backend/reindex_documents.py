@@ -13,6 +13,7 @@ Usage:
 """
 
 import argparse
+import numpy as np
 from app.services.vector_db import get_vector_db_service
 
 
@@ -52,23 +53,42 @@ def show_stats():
         print("No documents found in database.\n")
         return
     
-    all_items = vector_db.collection.get()
+    all_items = vector_db.collection.get(include=["documents", "metadatas"])
+    metadatas = all_items['metadatas']
+    if not metadatas:
+        print("No chunks found in database.\n")
+        return
+    
+    # Chunk sizes as one int64 array, grouped by document in single C passes
+    doc_ids = np.array([metadata.get('document_id') or "" for metadata in metadatas], dtype=object)
+    # map(len, ...) runs len in C; np.char.str_len would first copy every
+    # chunk into a fixed-width unicode array, which is far slower
+    sizes = np.fromiter(map(len, all_items['documents']), dtype=np.int64, count=len(all_items['documents']))
+    
+    # np.unique sorts ids; keep first-appearance order for display
+    unique_ids, first_index, inverse, counts = np.unique(
+        doc_ids, return_index=True, return_inverse=True, return_counts=True
+    )
+    order = np.argsort(inverse, kind="stable")
+    group_starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    sorted_sizes = sizes[order]
+    sums = np.bincount(inverse, weights=sizes, minlength=len(unique_ids))
+    mins = np.minimum.reduceat(sorted_sizes, group_starts)
+    maxs = np.maximum.reduceat(sorted_sizes, group_starts)
     
-    # Group chunks by document
     doc_chunks = {}
-    for metadata in all_items['metadatas']:
-        doc_id = metadata.get('document_id')
-        if doc_id not in doc_chunks:
-            doc_chunks[doc_id] = {
-                'filename': metadata.get('filename', 'Unknown'),
-                'chunks': [],
-                'total_chunks': metadata.get('total_chunks', 0)
-            }
-    
-    for doc_text, metadata in zip(all_items['documents'], all_items['metadatas']):
-        doc_id = metadata.get('document_id')
-        if doc_id:
-            doc_chunks[doc_id]['chunks'].append(len(doc_text))
+    for group in np.argsort(first_index):
+        doc_id = unique_ids[group]
+        if not doc_id:
+            continue
+        metadata = metadatas[first_index[group]]
+        doc_chunks[doc_id] = {
+            'filename': metadata.get('filename', 'Unknown'),
+            'total_chunks': metadata.get('total_chunks', 0),
+            'avg_size': sums[group] / counts[group],
+            'min_size': int(mins[group]),
+            'max_size': int(maxs[group])
+        }
     
     # Display statistics
     for doc_id, info in doc_chunks.items():
@@ -76,18 +96,14 @@ def show_stats():
         print(f"   Document ID: {doc_id[:20]}...")
         print(f"   Total Chunks: {info['total_chunks']}")
         
-        if info['chunks']:
-            avg_size = sum(info['chunks']) / len(info['chunks'])
-            min_size = min(info['chunks'])
-            max_size = max(info['chunks'])
-            
-            print(f"   Chunk Sizes: avg={avg_size:.0f}, min={min_size}, max={max_size} characters")
-            
-            # Determine if using old or new chunking
-            if avg_size < 700:
-                print(f"   OLD CHUNKING (500-char) - Consider re-uploading")
-            else:
-                print(f"   NEW CHUNKING (1000-char) - Good context")
+        avg_size = info['avg_size']
+        print(f"   Chunk Sizes: avg={avg_size:.0f}, min={info['min_size']}, max={info['max_size']} characters")
+        
+        # Determine if using old or new chunking
+        if avg_size < 700:
+            print(f"   OLD CHUNKING (500-char) - Consider re-uploading")
+        else:
+            print(f"   NEW CHUNKING (1000-char) - Good context")
         print()
     
     print(f"Total: {len(doc_chunks)} document(s)\n")
@@ -119,12 +135,18 @@ def clear_documents():
     
     print("\nDeleting documents...")
     
-    for doc in documents:
-        try:
-            vector_db.delete_document(doc['document_id'])
-            print(f"   ✓ Deleted: {doc['filename']}")
-        except Exception as e:
-            print(f"   Failed to delete {doc['filename']}: {str(e)}")
+    # One bulk delete; fall back to per-document deletes if it fails
+    try:
+        deleted = vector_db.delete_documents([doc['document_id'] for doc in documents])
+        print(f"   ✓ Deleted {deleted} document(s)")
+    except Exception as e:
+        print(f"   Bulk delete failed ({str(e)}), deleting one by one...")
+        for doc in documents:
+            try:
+                vector_db.delete_document(doc['document_id'])
+                print(f"   ✓ Deleted: {doc['filename']}")
+            except Exception as e:
+                print(f"   Failed to delete {doc['filename']}: {str(e)}")
     
     remaining = len(vector_db.list_documents())
     if remaining == 0: